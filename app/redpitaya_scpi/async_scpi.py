@@ -0,0 +1,212 @@
+"""
+Provides asyncio SCPI access to Red Pitaya from host computer.
+"""
+
+import asyncio
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+import numpy as np
+
+from app.redpitaya_scpi.redpitaya_scpi import (
+    scpi, ScpiError, Waveform, TriggerSource, Load, DataTriggerPosition, parse_ascii_array
+)
+
+
+class AsyncScpi (object):
+    """SCPI class used to access Red Pitaya over an IP network from an asyncio event loop.
+    Mirrors the transport and acquisition/generation API of `scpi` as coroutines."""
+    delimiter = scpi.delimiter
+    _delimiter_bytes = scpi._delimiter_bytes
+
+    # Command builders and validations are shared with the blocking client
+    _gen_set_commands = scpi._gen_set_commands
+    _validate_gen_set_params = scpi._validate_gen_set_params
+    _acq_data_query = scpi._acq_data_query
+    _validate_acq_data_params = scpi._validate_acq_data_params
+    _validate_channel = scpi._validate_channel
+
+    def __init__(self, host: str, timeout: Optional[float]=None, port: int=5000, limit: int=2**20):
+        """Initialize object. The connection is opened with `await open()` (or `async with`).
+        `limit` is the largest text reply that can be received (ASCII data replies
+        of the full buffer are about 150 kB).
+        """
+        self.host    = host
+        self.port    = port
+        self.timeout = timeout
+        self.limit   = limit
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+        self.errors: Deque[Tuple[int, str]] = deque(maxlen=256)    # Errors read from Red Pitaya
+
+    async def open(self):
+        """Open IP connection."""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=self.limit),
+            self.timeout
+        )
+        return self
+
+    async def close(self):
+        """Close IP connection."""
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except ConnectionError:
+                pass
+        self._reader = None
+        self._writer = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def rx_txt_bytes(self) -> bytes:
+        """Receive one reply and return its raw bytes without the delimiter."""
+        msg = await asyncio.wait_for(self._reader.readuntil(self._delimiter_bytes), self.timeout) # type: ignore
+        return msg[:-len(self._delimiter_bytes)]
+
+    async def rx_txt(self) -> str:
+        """Receive text string and return it after removing the delimiter."""
+        return (await self.rx_txt_bytes()).decode('utf-8')
+
+    async def rx_arb(self, dtype: Optional[str] = None):
+        """ Recieve binary data from scpi server.
+        Returns the block as `bytes`, or as a NumPy view with the given `dtype` (e.g. '>f4', '>i2')."""
+        return await asyncio.wait_for(self._rx_arb(dtype), self.timeout)
+
+    async def _rx_arb(self, dtype: Optional[str]):
+        if await self._reader.readexactly(1) != b'#': # type: ignore
+            return False
+
+        numOfNumBytes = int(await self._reader.readexactly(1)) # type: ignore
+        if numOfNumBytes <= 0:
+            return False
+
+        numOfBytes = int(await self._reader.readexactly(numOfNumBytes)) # type: ignore
+        data = await self._reader.readexactly(numOfBytes) # type: ignore
+
+        await self._reader.readexactly(2)      # recive \r\n # type: ignore
+
+        if dtype is not None:
+            return np.frombuffer(data, dtype=dtype)
+        return data
+
+    async def tx_txt(self, msg: str):
+        """Send text string ending and append delimiter."""
+        self._writer.write((msg + self.delimiter).encode('utf-8')) # type: ignore
+        await self._writer.drain() # type: ignore
+
+    async def tx_many(self, msgs: List[str]):
+        """Send several text strings, each with the delimiter appended, in a single write."""
+        self._writer.write("".join(msg + self.delimiter for msg in msgs).encode('utf-8')) # type: ignore
+        await self._writer.drain() # type: ignore
+
+    async def txrx_txt(self, msg: str):
+        """Send/receive text string."""
+        await self.tx_txt(msg)
+        return await self.rx_txt()
+
+    async def query_many(self, msgs: List[str]) -> List[str]:
+        """Send several queries in a single write and return their replies in order."""
+        await self.tx_many(msgs)
+        return [await self.rx_txt() for _ in msgs]
+
+    async def check_error(self, stop = True):
+        """Read errors from Red Pitaya and queue them in `errors`.
+        If `stop`, raise ScpiError when a critical error (code > 9500) was read."""
+        errors = []
+
+        res = int(await self.txrx_txt('*STB?'))
+        if (res & 0x4):
+            while 1:
+                err = await self.txrx_txt('SYST:ERR:NEXT?')
+                if (err.startswith('0,')):
+                    break
+                code, _, msg = err.partition(",")
+                errors.append((int(code), msg.strip('"')))
+
+        self.errors.extend(errors)
+        if stop and any(code > 9500 for code, _ in errors):
+            raise ScpiError(errors)
+
+    ### GENERATOR ###
+
+    async def gen_set(
+        self,
+        chan: int,
+        func: Waveform = Waveform.SINE,
+        volt: float = 1,
+        freq: float = 1000,
+        offset: Optional[float] = None,
+        phase: Optional[float] = None,
+        dcyc: Optional[float] = None,
+        data: Optional[np.ndarray] = None,
+        trig_sour: Optional[TriggerSource] = None,
+        ext_trig_deb_us: Optional[int] = None,
+        ext_trig_lev: Optional[float] = None,
+        load: Optional[Load] = None,
+        sdrlab: bool = False,
+        siglab: bool = False
+    ) -> None:
+        """
+        Set the parameters for signal generator on one channel.
+        See ``scpi.gen_set()`` for the description of the parameters.
+        """
+        await self.tx_many(self._gen_set_commands(chan, func, volt, freq, offset, phase, dcyc, data, trig_sour, ext_trig_deb_us, ext_trig_lev, load, sdrlab, siglab))
+        await self.check_error()
+
+    ### ACQUISITION ###
+
+    async def acq_data(
+        self,
+        chan: int,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        num_samples: Optional[int] = None,
+        old: bool = False,
+        last: bool = False,
+        trig_pos: Optional[DataTriggerPosition] = None,
+        input4: bool = False
+    ) -> np.ndarray:
+        """
+        Returns the acquired data on a channel from the Red Pitaya.
+        See ``scpi.acq_data()`` for the description of the parameters.
+        """
+        query = self._acq_data_query(chan, start, end, num_samples, old, last, trig_pos, input4)
+
+        # Get data type from Red Pitaya
+        units, data_format = await self.query_many(['ACQ:DATA:Units?', 'ACQ:DATA:FORMAT?'])
+
+        await self.tx_txt(query)
+        if data_format == "BIN":
+            buff = await self.rx_arb(dtype='>f4' if units == "VOLTS" else '>i2')
+        else:
+            buff = parse_ascii_array(await self.rx_txt_bytes())
+        await self.check_error()
+
+        return buff # type: ignore
+
+    async def acq_wait_fill(self, timeout: float = 5.0, poll_interval: float = 1e-3) -> None:
+        """
+        Wait until the acquisition buffer is full after a trigger, yielding to the
+        event loop between `ACQ:TRIG:FILL?` queries.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+
+        while (await self.txrx_txt("ACQ:TRIG:FILL?")).strip() != "1":
+            if loop.time() > deadline:
+                await self.tx_txt("ACQ:STOP")
+                raise TimeoutError("Timeout waiting for trigger and buffer fill")
+            await asyncio.sleep(poll_interval)
+
+    # IEEE Mandated Commands
+
+    async def idn_q(self):
+        """Identification Query"""
+        return await self.txrx_txt('*IDN?')
@@ -2,11 +2,19 @@
 Provides SCPI access to Red Pitaya from host computer.
 """
 
+import re
 import socket
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 from enum import Enum
-from typing import List, Optional, Union
+from typing import Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 import numpy as np
 
+from app.redpitaya_scpi.session_record import RecordingSocket
+from app.redpitaya_scpi.wire_stats import CountingSocket, WireStats
+
 __author__ = "Luka Golinar, Iztok Jeras, Miha Gjura"
 __copyright__ = "Copyright 2025, Red Pitaya"
 __OS_version__ = "IN DEV"
@@ -134,9 +142,142 @@ class LCRExtShunt(Enum):
     S100K = "S100k"
     S1M = "S1M"
 
+class ErrorCheck(Enum):
+    """When check_error() queries Red Pitaya for errors."""
+    CALL = "CALL"       # After every call (default)
+    BATCH = "BATCH"     # Once when the outermost batch() exits
+    TIMER = "TIMER"     # At most once every `error_check_interval` seconds
+    DEBUG = "DEBUG"     # Only while `debug` is True
+    OFF = "OFF"         # Only through poll_errors()
+
+class ScpiError(Exception):
+    """Errors reported by the Red Pitaya SCPI server as (code, message) pairs."""
+
+    def __init__(self, errors: List[Tuple[int, str]]):
+        self.errors = errors
+        super().__init__("; ".join(f"{code}: {msg}" for code, msg in errors))
+
+class AcqData(NamedTuple):
+    """Data of several acquisition channels, one row per channel."""
+    data: np.ndarray
+    channels: Tuple[int, ...]
+    units: str
+    data_format: str
+
+class BufferPool(object):
+    """Round-robin pool of reusable receive buffers for binary blocks."""
+
+    def __init__(self, size: int = 4):
+        assert size >= 1, "Buffer pool needs at least one buffer"
+        self._buffers = [bytearray() for _ in range(size)]
+        self._next = 0
+
+    def get(self, num_bytes: int) -> memoryview:
+        """
+        Return a writable view of `num_bytes` bytes on the next buffer of the pool.
+        The buffer is only reallocated when it is too small for the request, so the
+        view is overwritten once the pool wraps around.
+        """
+        i = self._next
+        self._next = (i + 1) % len(self._buffers)
+
+        if len(self._buffers[i]) < num_bytes:
+            self._buffers[i] = bytearray(num_bytes)
+
+        return memoryview(self._buffers[i])[:num_bytes]
+
+class PreparedCommand(object):
+    """SCPI command whose constant text is encoded to bytes once.
+    The template uses printf-style placeholders (e.g. 'DIG:PIN LED%d,%d'), so a call only
+    formats the arguments into the pre-encoded bytes."""
+
+    def __init__(self, rp: 'scpi', template: str):
+        self._rp = rp
+        self.template = template
+        self._data = (template + rp.delimiter).encode('utf-8')
+
+    def encode(self, *args) -> bytes:
+        """Return the command bytes, delimiter included."""
+        return self._data % args if args else self._data
+
+    def __call__(self, *args):
+        """Send the command."""
+        self._rp._tx_bytes(self.encode(*args))
+
+    def query(self, *args) -> str:
+        """Send the command and return its reply."""
+        self._rp._tx_bytes(self.encode(*args))
+        return self._rp.rx_txt()
+
+def parse_ascii_array(reply: bytes, dtype = np.float64) -> np.ndarray:
+    """Parse a '{v1,v2,...}' reply into a NumPy array in one pass, without per-value Python objects."""
+    start = reply.find(b'{') + 1
+    end = reply.rfind(b'}')
+    body = reply[start:end] if end >= start else reply[start:]
+
+    values = np.fromstring(body, dtype=dtype, sep=',')
+    expected = body.count(b',') + 1 if body.strip() else 0
+    if len(values) != expected:
+        raise ValueError(f"Invalid ASCII data: {reply[:60]!r}")
+    return values
+
+# Spellings of the cached settings -> one shadow state key ('ACQ:DEC:Factor' and 'ACQ:DEC' are the same setting)
+_STATE_KEY_FORMS = [
+    (re.compile(r'^ACQ:TR(?=:)'), 'ACQ:TRIG'),
+    (re.compile(r'^ACQ:TRIG:LEV(?:EL)?$'), 'ACQ:TRIG:LEV'),
+    (re.compile(r'^ACQ:DEC(?::F(?:ACTOR)?)?$'), 'ACQ:DEC'),
+    (re.compile(r'^ACQ:DATA:U(?:NITS)?$'), 'ACQ:DATA:UNITS'),
+    (re.compile(r'^OUTP(?:UT)?(\d?):STAT(?:E)?$'), r'OUTPUT\1:STATE'),
+]
+
+# Commands that change a cached setting to a value it cannot track (in other units or per channel)
+_STATE_KEY_VARIANTS = [
+    (re.compile(r'^ACQ:TRIG:DLY:(?:NS|CH\d|NS:CH\d)$'), 'ACQ:TRIG:DLY'),
+    (re.compile(r'^ACQ:TRIG:LEV(?:EL)?:CH\d$'), 'ACQ:TRIG:LEV'),
+    (re.compile(r'^ACQ:DEC:F(?:ACTOR)?:CH\d$'), 'ACQ:DEC'),
+    (re.compile(r'^ACQ:AVG:CH\d$'), 'ACQ:AVG'),
+]
+
+def _state_key(header: str) -> str:
+    """Shadow state key of a command header, the same for its long and short forms."""
+    key = header.upper()
+    for pattern, canonical in _STATE_KEY_FORMS:
+        key = pattern.sub(canonical, key)
+    return key
+
+_resolved_hosts: Dict[Tuple[str, int], Tuple[str, int]] = {}
+
+def resolve_host(host: str, port: int = 5000, timeout: Optional[float] = None) -> Tuple[str, int]:
+    """Return the (address, port) of `host`, resolving it only the first time.
+    Resolving mDNS names ('rp-xxxxxx.local') can take seconds; with `timeout` the lookup
+    runs on a helper thread and TimeoutError is raised after `timeout` seconds."""
+    key = (host, port)
+    address = _resolved_hosts.get(key)
+    if address is None:
+        lookup = lambda: socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+        if timeout is None:
+            address = lookup()
+        else:
+            # getaddrinfo() has no timeout of its own, a late lookup finishes in the background
+            executor = ThreadPoolExecutor(max_workers=1)
+            try:
+                address = executor.submit(lookup).result(timeout=timeout)
+            except FutureTimeoutError:
+                raise TimeoutError(f"Resolving {host} took more than {timeout} s") from None
+            finally:
+                executor.shutdown(wait=False)
+        _resolved_hosts[key] = address
+    return address
+
+def forget_host(host: Optional[str] = None):
+    """Drop the cached address of `host` (of all hosts by default)."""
+    for key in [key for key in _resolved_hosts if host is None or key[0] == host]:
+        _resolved_hosts.pop(key, None)
+
 class scpi (object):
     """SCPI class used to access Red Pitaya over an IP network."""
     delimiter = '\r\n'
+    _delimiter_bytes = delimiter.encode('utf-8')
 
 
     ####################################################
@@ -146,23 +287,60 @@ class scpi (object):
     #! Functions in this section should not be modified as they take care of the communication between Red Pitaya and the computer
     #
 
-    def __init__(self, host: str, timeout: Optional[float]=None, port: int=5000):
+    def __init__(self, host: str, timeout: Optional[float]=None, port: int=5000, arb_pool_size: int=4, nodelay: Optional[bool]=None, sock=None, connect_timeout: Optional[float]=None):
         """Initialize object and open IP connection.
         Host IP should be a string in parentheses, like '192.168.1.100' or 'rp-xxxxxx.local'.
+        The resolved address is cached, see ``resolve_host()``. `connect_timeout` bounds the
+        connection attempt (defaults to `timeout`).
+        Binary blocks are received into a pool of `arb_pool_size` reusable buffers.
+        If `nodelay` is not None, TCP_NODELAY is set accordingly on the socket.
+        An already connected socket (or socket-like object, e.g. a ReplaySocket) can be passed as `sock`.
         """
         self.host    = host
         self.port    = port
         self.timeout = timeout
 
+        self._rx_buf  = bytearray()             # Received bytes not consumed yet
+        self._rx_pool = BufferPool(arb_pool_size)
+
+        self._tx_queue    = bytearray()         # Commands buffered by batch()
+        self._batch_depth = 0
+
+        self._state: Dict[str, str] = {}        # Last value written per command header
+        self.cache_enabled = True
+
+        self.error_check = ErrorCheck.CALL
+        self.error_check_interval = 1.0
+        self.debug = False
+        self.errors: Deque[Tuple[int, str]] = deque(maxlen=256)    # Errors read from Red Pitaya
+        self._error_check_pending = False
+        self._last_error_check = 0.0
+
+        self.stats: Optional[WireStats] = None  # Set by enable_stats()
+
+        if sock is not None:
+            self._socket = sock
+            return
+
         try:
             self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
-            if timeout is not None:
+            if connect_timeout is not None:
+                self._socket.settimeout(connect_timeout)
+            elif timeout is not None:
+                self._socket.settimeout(timeout)
+
+            self._socket.connect(resolve_host(host, port, connect_timeout if connect_timeout is not None else timeout))
+
+            if connect_timeout is not None:
                 self._socket.settimeout(timeout)
 
-            self._socket.connect((host, port))
+            if nodelay is not None:
+                self.set_nodelay(nodelay)
 
         except socket.error as e:
+            # The board may have a new address next time
+            forget_host(host)
             print('SCPI >> connect({!s:s}:{:d}) failed: {!s:s}'.format(host, port, e))
 
     def __del__(self):
@@ -174,14 +352,111 @@ class scpi (object):
         """Close IP connection."""
         self.__del__()
 
+    def enable_stats(self, log_interval: Optional[float] = None) -> WireStats:
+        """Start counting commands, bytes, socket calls and round-trip times, see ``WireStats``.
+        If `log_interval` is set, a summary line is printed every `log_interval` seconds."""
+        if self.stats is None:
+            self.stats = WireStats(log_interval)
+            self._socket = CountingSocket(self._socket, self.stats)
+        else:
+            self.stats.log_interval = log_interval
+        return self.stats
+
+    def disable_stats(self):
+        """Stop counting and return the last snapshot."""
+        if self.stats is None:
+            return {}
+        snapshot = self.stats.snapshot()
+        self._unwrap_socket(CountingSocket)
+        self.stats = None
+        return snapshot
+
+    def start_recording(self, path: str):
+        """Record every chunk sent and received on the connection to the session file `path`.
+        See ``session_record`` for replaying it."""
+        self.stop_recording()
+        self._socket = RecordingSocket(self._socket, path)
+
+    def stop_recording(self):
+        """Stop recording and close the session file."""
+        recorder = self._unwrap_socket(RecordingSocket)
+        if recorder is not None:
+            recorder.stop()
+
+    def _unwrap_socket(self, wrapper_type):
+        """Remove the socket wrapper of type `wrapper_type` from the socket chain and return it."""
+        parent = None
+        sock = self._socket
+        while sock is not None and hasattr(sock, '_sock'):
+            if isinstance(sock, wrapper_type):
+                if parent is None:
+                    self._socket = sock._sock
+                else:
+                    parent._sock = sock._sock
+                return sock
+            parent, sock = sock, sock._sock
+        return None
+
+    def set_nodelay(self, enabled: bool = True):
+        """Enable/disable TCP_NODELAY (Nagle's algorithm off/on) on the connection."""
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(enabled)) # type: ignore
+
+    @contextmanager
+    def batch(self):
+        """Buffer the commands sent inside the `with` block and send them with a single write
+        when the outermost block exits. Receiving a reply flushes the buffered commands first.
+        If the block raises, the commands that were not sent yet are discarded."""
+        self._batch_depth += 1
+        try:
+            yield self
+        except BaseException:
+            if self._batch_depth == 1:
+                self._tx_queue.clear()
+            raise
+        finally:
+            self._batch_depth -= 1
+        if self._batch_depth == 0:
+            self.flush()
+            if self._error_check_pending:
+                self._error_check_pending = False
+                self._check_error_now()
+
+    def flush(self):
+        """Send the commands buffered by batch()."""
+        if self._tx_queue:
+            data = bytes(self._tx_queue)
+            self._tx_queue.clear()
+            self._socket.sendall(data) # type: ignore
+            if self.stats is not None:
+                self.stats.flushed()
+
+    def rx_txt_bytes(self, chunksize: int = 4096) -> bytes:
+        """Receive one reply and return its raw bytes without the delimiter.
+        Bytes received after the delimiter are kept for the next reply."""
+        if self._tx_queue:
+            self.flush()
+
+        delimiter = self._delimiter_bytes
+        start = 0
+        while 1:
+            end = self._rx_buf.find(delimiter, start)
+            if end >= 0:
+                msg = bytes(self._rx_buf[:end])
+                del self._rx_buf[:end + len(delimiter)]
+                if self.stats is not None:
+                    self.stats.reply_received()
+                return msg
+            # Only rescan the tail that could hold a delimiter split between chunks
+            start = max(0, len(self._rx_buf) - len(delimiter) + 1)
+
+            chunk = self._socket.recv(chunksize)        # Receive chunk size of 2^n preferably # type: ignore
+            if not chunk:
+                raise ConnectionError(f"SCPI >> connection to {self.host}:{self.port} closed")
+            self._rx_buf += chunk
+
     def rx_txt(self, chunksize: int = 4096):
         """Receive text string and return it after removing the delimiter."""
-        msg = ''
-        while 1:
-            chunk = self._socket.recv(chunksize).decode('utf-8')        # Receive chunk size of 2^n preferably # type: ignore
-            msg += chunk
-            if (len(msg) >= 2 and msg[-2:] == self.delimiter):
-                return msg[:-2]
+        return self.rx_txt_bytes(chunksize).decode('utf-8')
 
     def rx_txt_check_error(self, chunksize: int = 4096, stop: bool = True):
         """Receive text string and return it after removing the delimiter.
@@ -190,36 +465,78 @@ class scpi (object):
         self.check_error(stop)
         return msg
 
-    def rx_arb(self):
-        """ Recieve binary data from scpi server"""
-        numOfBytes = 0
-        data=b''
-        while len(data) != 1:
-            data = self._socket.recv(1) # type: ignore
-        if data != b'#':
+    def _rx_fill(self, min_len: int, chunksize: int = 64):
+        """Receive into the internal buffer until it holds at least `min_len` bytes."""
+        while len(self._rx_buf) < min_len:
+            chunk = self._socket.recv(max(chunksize, min_len - len(self._rx_buf))) # type: ignore
+            if not chunk:
+                raise ConnectionError(f"SCPI >> connection to {self.host}:{self.port} closed")
+            self._rx_buf += chunk
+
+    def _rx_take(self, num_bytes: int) -> bytes:
+        """Remove and return `num_bytes` bytes from the internal buffer."""
+        self._rx_fill(num_bytes)
+        data = bytes(self._rx_buf[:num_bytes])
+        del self._rx_buf[:num_bytes]
+        return data
+
+    def _rx_into(self, view: memoryview):
+        """Fill `view` completely, first from the internal buffer and then straight from the socket."""
+        n = min(len(self._rx_buf), len(view))
+        view[:n] = self._rx_buf[:n]
+        del self._rx_buf[:n]
+
+        while n < len(view):
+            r_size = self._socket.recv_into(view[n:]) # type: ignore
+            if r_size == 0:
+                raise ConnectionError(f"SCPI >> connection to {self.host}:{self.port} closed")
+            n += r_size
+
+    def _rx_arb_len(self):
+        """Receive the header of a binary block and return its payload length, False on a bad header.
+        A reply that is not a binary block (e.g. 'ERR!') is left unread, see _rx_skip_reply()."""
+        if self._tx_queue:
+            self.flush()
+
+        self._rx_fill(1)
+        if self._rx_buf[:1] != b'#':
             return False
-        data=b''
+        del self._rx_buf[:1]
 
-        while len(data) != 1:
-            data = self._socket.recv(1) # type: ignore
-        numOfNumBytes = int(data)
+        numOfNumBytes = int(self._rx_take(1))
         if numOfNumBytes <= 0:
             return False
-        data=b''
 
-        while len(data) != numOfNumBytes:
-            data += (self._socket.recv(1)) # type: ignore
-        numOfBytes = int(data)
-        data=b''
+        return int(self._rx_take(numOfNumBytes))
+
+    def rx_arb(self, dtype: Optional[str] = None):
+        """ Recieve binary data from scpi server.
+        The block is received into a buffer of the connection pool and returned as a
+        `memoryview`, or as a NumPy view with the given `dtype` (e.g. '>f4', '>i2').
+        Either view is overwritten after `arb_pool_size` further binary reads."""
+        numOfBytes = self._rx_arb_len()
+        if numOfBytes is False:
+            self._rx_skip_reply()
+            return False
+        t0 = time.perf_counter()
 
-        while len(data) < numOfBytes:
-            r_size = min(numOfBytes - len(data),4096)
-            data += (self._socket.recv(r_size)) # type: ignore
+        data = self._rx_pool.get(numOfBytes)
+        self._rx_into(data)
 
-        self._socket.recv(2)        # recive \r\n # type: ignore
+        self._rx_take(2)            # recive \r\n
+        if self.stats is not None:
+            self.stats.arb_received(numOfBytes, time.perf_counter() - t0)
 
+        if dtype is not None:
+            return np.frombuffer(data, dtype=dtype)
         return data
 
+    def _rx_skip_reply(self):
+        """Discard a text reply received where a binary block was expected."""
+        reply = self.rx_txt_bytes()
+        if self.debug:
+            print(f"SCPI >> skipped reply {reply[:60]!r}")
+
     def rx_arb_check_error(self, stop: bool = True):
         """ Recieve binary data from scpi server. Check for error."""
         data = self.rx_arb()
@@ -228,8 +545,35 @@ class scpi (object):
 
     def tx_txt(self, msg: str):
         """Send text string ending and append delimiter."""
+        self._track_state(msg)
+        if self.stats is not None:
+            self.stats.command_sent(msg, self._batch_depth > 0)
+        if self._batch_depth:
+            self._tx_queue += (msg + self.delimiter).encode('utf-8')
+            return None
         return self._socket.sendall((msg + self.delimiter).encode('utf-8'))     # was send(().encode('utf-8')) # type: ignore
 
+    def _tx_bytes(self, data: bytes):
+        """Send an already encoded command (delimiter included)."""
+        if self._state or self.stats is not None:
+            msg = data[:-len(self._delimiter_bytes)].decode('utf-8')
+            self._track_state(msg)
+            if self.stats is not None:
+                self.stats.command_sent(msg, self._batch_depth > 0)
+        if self._batch_depth:
+            self._tx_queue += data
+        else:
+            self._socket.sendall(data) # type: ignore
+
+    def tx_many(self, msgs: List[str]):
+        """Send several text strings, each with the delimiter appended, in a single write."""
+        with self.batch():
+            for msg in msgs:
+                self._track_state(msg)
+                if self.stats is not None:
+                    self.stats.command_sent(msg, True)
+                self._tx_queue += (msg + self.delimiter).encode('utf-8')
+
     def tx_txt_check_error(self, msg: str, stop: bool= True):
         """Send text string ending and append delimiter. Check for error."""
         self.tx_txt(msg)
@@ -240,18 +584,150 @@ class scpi (object):
         self.tx_txt(msg)
         return self.rx_txt()
 
+    def query_many(self, msgs: List[str]) -> List[str]:
+        """Send several queries in a single write and return their replies in order."""
+        self.tx_many(msgs)
+        return [self.rx_txt() for _ in msgs]
+
+    def prepare(self, template: str) -> PreparedCommand:
+        """Prepare a command for hot loops, see ``PreparedCommand``.
+
+        Example:
+            led = rp.prepare('DIG:PIN LED%d,%d')
+            with rp.batch():
+                for i in range(8):
+                    led(i, 1)
+        """
+        return PreparedCommand(self, template)
+
+    ### Shadow state ###
+
+    def tx_set(self, header: str, value) -> bool:
+        """Send `header value` unless it is the last value written for `header`.
+        Returns True if the command was sent."""
+        key = _state_key(header)
+        value = str(value)
+        if self.cache_enabled and self._state.get(key) == value:
+            return False
+        self.tx_txt(f"{header} {value}")
+        self._state[key] = value
+        return True
+
+    def query_cached(self, header: str) -> str:
+        """Return the last value written for `header`, querying `header?` when it is unknown."""
+        key = _state_key(header)
+        if self.cache_enabled and key in self._state:
+            return self._state[key]
+        value = self.txrx_txt(f"{header}?")
+        self._state[key] = value
+        return value
+
+    def query_cached_many(self, headers: List[str]) -> List[str]:
+        """Like query_cached() for several headers, the unknown ones are queried in a single write."""
+        keys = [_state_key(header) for header in headers]
+        unknown = [key for key in keys if not (self.cache_enabled and key in self._state)]
+        if unknown:
+            for key, value in zip(unknown, self.query_many([f"{key}?" for key in unknown])):
+                self._state[key] = value
+        return [self._state[key] for key in keys]
+
+    def cached(self, header: str) -> Optional[str]:
+        """Return the cached value of `header` or None if it is unknown."""
+        return self._state.get(_state_key(header))
+
+    def has_state(self, prefix: str = "") -> bool:
+        """True if any setting starting with `prefix` is cached."""
+        prefix = prefix.upper()
+        return any(key.startswith(prefix) for key in self._state)
+
+    def invalidate_state(self, prefix: str = ""):
+        """Forget the cached settings starting with `prefix` (all of them by default)."""
+        prefix = prefix.upper()
+        for key in [key for key in self._state if key.startswith(prefix)]:
+            del self._state[key]
+
+    def _track_state(self, msg: str):
+        """Keep the shadow state coherent with a command sent through tx_txt().
+        Long and short spellings of a header update the same setting."""
+        if not self._state:
+            return
+        header, _, value = msg.partition(' ')
+        key = _state_key(header)
+        if key.endswith('?'):
+            return
+        if key == '*RST':
+            self._state.clear()
+        elif key == 'ACQ:RST':
+            self.invalidate_state('ACQ:')
+        elif key.endswith(':FUNC:RESET'):
+            chan = key[len('SOUR'):-len(':FUNC:RESET')]       # '' resets both channels
+            self.invalidate_state(f'SOUR{chan}')
+            self.invalidate_state(f'OUTPUT{chan}')
+        elif key in self._state:
+            self._state[key] = value.strip()
+        else:
+            # A variant of a cached setting (e.g. ACQ:TRIG:DLY:NS) changes it to an unknown value
+            for pattern, cached in _STATE_KEY_VARIANTS:
+                if pattern.match(key):
+                    self._state.pop(cached, None)
+
     def check_error(self, stop = True):
-        """Read error from Red Pitaya and print it."""
+        """Read errors from Red Pitaya according to the `error_check` policy and queue them in `errors`.
+        If `stop`, raise ScpiError when a critical error (code > 9500) was read."""
+        policy = self.error_check
+
+        if policy == ErrorCheck.CALL:
+            self._check_error_now(stop)
+        elif policy == ErrorCheck.BATCH:
+            if self._batch_depth:
+                self._error_check_pending = True
+            else:
+                self._check_error_now(stop)
+        elif policy == ErrorCheck.TIMER:
+            if time.monotonic() - self._last_error_check >= self.error_check_interval:
+                self._check_error_now(stop)
+        elif policy == ErrorCheck.DEBUG:
+            if self.debug:
+                self._check_error_now(stop)
+
+    def _check_error_now(self, stop = True):
+        t0 = time.perf_counter()
+        errors = self.poll_errors()
+        if self.stats is not None:
+            self.stats.error_checked(time.perf_counter() - t0)
+        if stop and any(code > 9500 for code, _ in errors):
+            raise ScpiError(errors)
+
+    def poll_errors(self) -> List[Tuple[int, str]]:
+        """Read all pending errors from Red Pitaya, queue them in `errors` and return them."""
+        self._last_error_check = time.monotonic()
+        errors = []
+
         res = int(self.stb_q()) # type: ignore
         if (res & 0x4):
             while 1:
                 err = self.err_n()
                 if (err.startswith('0,')): # type: ignore
                     break
-                print(err)
-                n = err.split(",") # type: ignore
-                if (len(n) > 0 and stop and int(n[0]) > 9500):
-                    exit(1)
+                code, _, msg = err.partition(",") # type: ignore
+                errors.append((int(code), msg.strip('"')))
+
+        if errors:
+            # A rejected setting leaves the shadow state out of sync
+            self.invalidate_state()
+            self.errors.extend(errors)
+        return errors
+
+    def take_errors(self) -> List[Tuple[int, str]]:
+        """Remove and return the queued errors."""
+        errors = list(self.errors)
+        self.errors.clear()
+        return errors
+
+    def raise_errors(self):
+        """Raise ScpiError with the queued errors, if there are any."""
+        if self.errors:
+            raise ScpiError(self.take_errors())
 
 
     ###########################################
@@ -273,10 +749,7 @@ class scpi (object):
         """
         Returns Red Pitaya board ID and model name.
         """
-        settings = []
-
-        settings.append(self.txrx_txt('SYSTem:BRD:ID?'))
-        settings.append(self.txrx_txt('SYSTem:BRD:Name?'))
+        settings = self.query_many(['SYSTem:BRD:ID?', 'SYSTem:BRD:Name?'])
         self.check_error()
 
         #? Remove prints?
@@ -299,8 +772,9 @@ class scpi (object):
 
         """
 
-        self.tx_txt(f"SYSTem:DATE \"{date}\"")
-        self.tx_txt(f"SYSTem:TIME \"{time}\"")
+        with self.batch():
+            self.tx_txt(f"SYSTem:DATE \"{date}\"")
+            self.tx_txt(f"SYSTem:TIME \"{time}\"")
         self.check_error()
 
     def board_get_date_time(
@@ -312,8 +786,7 @@ class scpi (object):
         Returns:
             str: Date and time in format "YYYY-MM-DD hh:mm:ss" 
         """
-        date = self.txrx_txt("SYSTem:DATE?")
-        time = self.txrx_txt("SYSTem:TIME?")
+        date, time = self.query_many(["SYSTem:DATE?", "SYSTem:TIME?"])
         self.check_error()
 
         return f"{date} {time}"
@@ -338,7 +811,7 @@ class scpi (object):
         """
         Return data from all 4 slow analog inputs as a numpy array.
         """
-        data = np.array([self.txrx_txt(f"ANALOG:PIN? AIN{i}") for i in range(4)], dtype=float)
+        data = np.array(self.query_many([f"ANALOG:PIN? AIN{i}" for i in range(4)]), dtype=float)
         self.check_error()
 
         return data
@@ -365,16 +838,17 @@ class scpi (object):
         if trig_mode is not None and trig_mode.upper() not in trig_mode_list:
             raise ValueError(f"{trig_mode.upper()} is not a defined trigger source")
     
-        if x_channel:
-            # Set up X-channel daisy chain
-            self.tx_txt("DAISY:SYNC:CLK ON")
-            self.tx_txt("DAISY:SYNC:TRIG ON")
-
-        elif click_shield:
-            # Set up Click Shield daisy chain
-            self.tx_txt("DAISY:TRig:Out:ENable ON")
-            if trig_mode is not None:
-                self.tx_txt(f"DAISY:TRig:Out:SOUR {trig_mode.upper()}")
+        with self.batch():
+            if x_channel:
+                # Set up X-channel daisy chain
+                self.tx_txt("DAISY:SYNC:CLK ON")
+                self.tx_txt("DAISY:SYNC:TRIG ON")
+
+            elif click_shield:
+                # Set up Click Shield daisy chain
+                self.tx_txt("DAISY:TRig:Out:ENable ON")
+                if trig_mode is not None:
+                    self.tx_txt(f"DAISY:TRig:Out:SOUR {trig_mode.upper()}")
         self.check_error()
 
     def daisy_get_settings(
@@ -387,12 +861,12 @@ class scpi (object):
         Returns:
             str: Daisy chain settings.
         """
-        settings = [
-            self.txrx_txt("DAISY:SYNC:CLK?"),
-            self.txrx_txt("DAISY:SYNC:TRIG?"),
-            self.txrx_txt("DAISY:TRig:Out:ENable?"),
-            self.txrx_txt("DAISY:TRig:Out:SOUR?")
-        ]
+        settings = self.query_many([
+            "DAISY:SYNC:CLK?",
+            "DAISY:SYNC:TRIG?",
+            "DAISY:TRig:Out:ENable?",
+            "DAISY:TRig:Out:SOUR?"
+        ])
         self.check_error()
 
         #? Remove prints?
@@ -457,8 +931,7 @@ class scpi (object):
         settings = []
 
         if siglab:
-            pll_enable = self.txrx_txt("RP:PLL:ENable?")
-            pll_state = self.txrx_txt("RP:PLL:STATE?")
+            pll_enable, pll_state = self.query_many(["RP:PLL:ENable?", "RP:PLL:STATE?"])
             self.check_error()
             settings = [pll_enable, pll_state]
 
@@ -549,35 +1022,7 @@ class scpi (object):
         other than STEMlab 125-14, change the bool value of the appropriate
         parameter to true (sdrlab, siglab)
         """
-        self._validate_gen_set_params(chan, func, volt, freq, offset, phase, dcyc, data, trig_sour, ext_trig_deb_us, ext_trig_lev, load, sdrlab, siglab)
-
-        # Load needs to be set before the amplitude
-        if siglab:
-            if ext_trig_lev is not None:
-                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lev}")
-            if load is not None:
-                self.tx_txt(f"SOUR{chan}:LOAD {load.value}")
-
-        self.tx_txt(f"SOUR{chan}:FUNC {func.value}")
-        self.tx_txt(f"SOUR{chan}:VOLT {volt}")
-
-        if func not in {Waveform.DC, Waveform.DC_NEG}:
-            self.tx_txt(f"SOUR{chan}:FREQ:FIX {freq}")
-
-        if offset is not None:
-            self.tx_txt(f"SOUR{chan}:VOLT:OFFS {offset}")
-        if phase is not None:
-            self.tx_txt(f"SOUR{chan}:PHAS {phase}")
-        if func == Waveform.PWM and dcyc is not None:
-            self.tx_txt(f"SOUR{chan}:DCYC {dcyc}")
-        if data is not None and func == Waveform.ARBITRARY:
-            cust_wf = ",".join(map(str, data))
-            self.tx_txt(f"SOUR{chan}:TRAC:DATA:DATA {cust_wf}")
-        if trig_sour is not None:
-            self.tx_txt(f"SOUR{chan}:TRig:SOUR {trig_sour.value}")
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"SOUR:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
-
+        self.tx_many(self._gen_set_commands(chan, func, volt, freq, offset, phase, dcyc, data, trig_sour, ext_trig_deb_us, ext_trig_lev, load, sdrlab, siglab))
         self.check_error()
 
     def gen_get_settings(self, chan: int, siglab: bool = False) -> List[str | None]:
@@ -609,20 +1054,22 @@ class scpi (object):
             str: Generator settings for the specified channel.
         """
 
-        settings = [
-            self.txrx_txt(f"SOUR{chan}:FUNC?"),
-            self.txrx_txt(f"SOUR{chan}:VOLT?"),
-            self.txrx_txt(f"SOUR{chan}:FREQ:FIX?"),
-            self.txrx_txt(f"SOUR{chan}:VOLT:OFFS?"),
-            self.txrx_txt(f"SOUR{chan}:PHAS?"),
-            self.txrx_txt(f"SOUR{chan}:DCYC?"),
-            self.txrx_txt(f"SOUR{chan}:TRig:SOUR?"),
-            self.txrx_txt("SOUR:TRig:EXT:DEBouncer:US?")
+        queries = [
+            f"SOUR{chan}:FUNC?",
+            f"SOUR{chan}:VOLT?",
+            f"SOUR{chan}:FREQ:FIX?",
+            f"SOUR{chan}:VOLT:OFFS?",
+            f"SOUR{chan}:PHAS?",
+            f"SOUR{chan}:DCYC?",
+            f"SOUR{chan}:TRig:SOUR?",
+            "SOUR:TRig:EXT:DEBouncer:US?"
         ]
 
         if siglab:
-            settings.append(self.txrx_txt("TRig:EXT:LEV?"))
-            settings.append(self.txrx_txt(f"SOUR{chan}:LOAD?"))
+            queries.append("TRig:EXT:LEV?")
+            queries.append(f"SOUR{chan}:LOAD?")
+
+        settings = self.query_many(queries)
 
         self.check_error()
 
@@ -704,15 +1151,16 @@ class scpi (object):
         """
         self._validate_burst_params(chan, ncyc, nor, period, init_val, last_val, siglab)
 
-        self.tx_txt(f"SOUR{chan}:BURS:STAT BURST")
-        self.tx_txt(f"SOUR{chan}:BURS:NCYC {ncyc}")
-        self.tx_txt(f"SOUR{chan}:BURS:NOR {nor}")
+        with self.batch():
+            self.tx_txt(f"SOUR{chan}:BURS:STAT BURST")
+            self.tx_txt(f"SOUR{chan}:BURS:NCYC {ncyc}")
+            self.tx_txt(f"SOUR{chan}:BURS:NOR {nor}")
 
-        if period is not None:
-            self.tx_txt(f"SOUR{chan}:BURS:INT:PER {period}")
+            if period is not None:
+                self.tx_txt(f"SOUR{chan}:BURS:INT:PER {period}")
 
-        self.tx_txt(f"SOUR{chan}:BURS:LASTValue {last_val}")
-        self.tx_txt(f"SOUR{chan}:INITValue {init_val}")
+            self.tx_txt(f"SOUR{chan}:BURS:LASTValue {last_val}")
+            self.tx_txt(f"SOUR{chan}:INITValue {init_val}")
 
         self.check_error()
 
@@ -736,14 +1184,14 @@ class scpi (object):
             str: Burst generator settings for the specified channel.
         """
 
-        settings = [
-            self.txrx_txt(f"SOUR{chan}:BURS:STAT?"),
-            self.txrx_txt(f"SOUR{chan}:BURS:NCYC?"),
-            self.txrx_txt(f"SOUR{chan}:BURS:NOR?"),
-            self.txrx_txt(f"SOUR{chan}:BURS:INT:PER?"),
-            self.txrx_txt(f"SOUR{chan}:BURS:INITValue?"),
-            self.txrx_txt(f"SOUR{chan}:LASTValue?")
-        ]
+        settings = self.query_many([
+            f"SOUR{chan}:BURS:STAT?",
+            f"SOUR{chan}:BURS:NCYC?",
+            f"SOUR{chan}:BURS:NOR?",
+            f"SOUR{chan}:BURS:INT:PER?",
+            f"SOUR{chan}:BURS:INITValue?",
+            f"SOUR{chan}:LASTValue?"
+        ])
 
         self.check_error()
 
@@ -798,12 +1246,13 @@ class scpi (object):
 
         self._validate_sweep_params(chan, start_freq, stop_freq, time_us, mode, direction, sdrlab)
 
-        self.tx_txt(f"SOUR{chan}:SWeep:STATE ON")
-        self.tx_txt(f"SOUR{chan}:SWeep:FREQ:START {start_freq}")
-        self.tx_txt(f"SOUR{chan}:SWeep:FREQ:STOP {stop_freq}")
-        self.tx_txt(f"SOUR{chan}:SWeep:TIME {time_us}")
-        self.tx_txt(f"SOUR{chan}:SWeep:MODE {mode.value}")
-        self.tx_txt(f"SOUR{chan}:SWeep:DIR {direction.value}")
+        with self.batch():
+            self.tx_txt(f"SOUR{chan}:SWeep:STATE ON")
+            self.tx_txt(f"SOUR{chan}:SWeep:FREQ:START {start_freq}")
+            self.tx_txt(f"SOUR{chan}:SWeep:FREQ:STOP {stop_freq}")
+            self.tx_txt(f"SOUR{chan}:SWeep:TIME {time_us}")
+            self.tx_txt(f"SOUR{chan}:SWeep:MODE {mode.value}")
+            self.tx_txt(f"SOUR{chan}:SWeep:DIR {direction.value}")
 
         self.check_error()
 
@@ -826,14 +1275,14 @@ class scpi (object):
 
         """
 
-        settings = [
-            self.txrx_txt(f"SOUR{chan}:SWeep:STATE?"),
-            self.txrx_txt(f"SOUR{chan}:SWeep:FREQ:START?"),
-            self.txrx_txt(f"SOUR{chan}:SWeep:FREQ:STOP?"),
-            self.txrx_txt(f"SOUR{chan}:SWeep:TIME?"),
-            self.txrx_txt(f"SOUR{chan}:SWeep:MODE?"),
-            self.txrx_txt(f"SOUR{chan}:SWeep:DIR?")
-        ]
+        settings = self.query_many([
+            f"SOUR{chan}:SWeep:STATE?",
+            f"SOUR{chan}:SWeep:FREQ:START?",
+            f"SOUR{chan}:SWeep:FREQ:STOP?",
+            f"SOUR{chan}:SWeep:TIME?",
+            f"SOUR{chan}:SWeep:MODE?",
+            f"SOUR{chan}:SWeep:DIR?"
+        ])
 
         self.check_error()
 
@@ -880,6 +1329,60 @@ class scpi (object):
         self.check_error()
 
 
+    # Command builders
+    def _gen_set_commands(
+        self,
+        chan: int,
+        func: Waveform,
+        volt: float,
+        freq: float,
+        offset: Optional[float],
+        phase: Optional[float],
+        dcyc: Optional[float],
+        data: Optional[np.ndarray],
+        trig_sour: Optional[TriggerSource],
+        ext_trig_deb_us: Optional[int],
+        ext_trig_lev: Optional[float],
+        load: Optional[Load],
+        sdrlab: bool,
+        siglab: bool
+    ) -> List[str]:
+        """
+        Validate parameters for gen_set function and return its command sequence.
+        """
+        self._validate_gen_set_params(chan, func, volt, freq, offset, phase, dcyc, data, trig_sour, ext_trig_deb_us, ext_trig_lev, load, sdrlab, siglab)
+
+        commands = []
+
+        # Load needs to be set before the amplitude
+        if siglab:
+            if ext_trig_lev is not None:
+                commands.append(f"TRig:EXT:LEV {ext_trig_lev}")
+            if load is not None:
+                commands.append(f"SOUR{chan}:LOAD {load.value}")
+
+        commands.append(f"SOUR{chan}:FUNC {func.value}")
+        commands.append(f"SOUR{chan}:VOLT {volt}")
+
+        if func not in {Waveform.DC, Waveform.DC_NEG}:
+            commands.append(f"SOUR{chan}:FREQ:FIX {freq}")
+
+        if offset is not None:
+            commands.append(f"SOUR{chan}:VOLT:OFFS {offset}")
+        if phase is not None:
+            commands.append(f"SOUR{chan}:PHAS {phase}")
+        if func == Waveform.PWM and dcyc is not None:
+            commands.append(f"SOUR{chan}:DCYC {dcyc}")
+        if data is not None and func == Waveform.ARBITRARY:
+            cust_wf = ",".join(map(str, data))
+            commands.append(f"SOUR{chan}:TRAC:DATA:DATA {cust_wf}")
+        if trig_sour is not None:
+            commands.append(f"SOUR{chan}:TRig:SOUR {trig_sour.value}")
+        if ext_trig_deb_us is not None:
+            commands.append(f"SOUR:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+
+        return commands
+
     # Validations
     def _validate_gen_set_params(
         self,
@@ -1048,19 +1551,20 @@ class scpi (object):
 
         #!!!!! n = 4 if input4 else 2
 
-        self.tx_txt(f"ACQ:DEC:Factor {dec}")
-        self.tx_txt(f"ACQ:AVG {'ON' if averaging else 'OFF'}")
-        if units is not None:
-            self.tx_txt(f"ACQ:DATA:Units {units.value}")
-        if data_format is not None:
-            self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
-
-        if gain is not None:
-            for i, g in enumerate(gain, start=1):
-                self.tx_txt(f"ACQ:SOUR{i}:GAIN {g.value}")
-        if coupling is not None and siglab:
-            for i, c in enumerate(coupling, start=1):
-                self.tx_txt(f"ACQ:SOUR{i}:COUP {c.value}")
+        with self.batch():
+            self.tx_set("ACQ:DEC", dec)
+            self.tx_set("ACQ:AVG", 'ON' if averaging else 'OFF')
+            if units is not None:
+                self.tx_set("ACQ:DATA:Units", units.value)
+            if data_format is not None:
+                self.tx_set("ACQ:DATA:FORMAT", data_format.value)
+
+            if gain is not None:
+                for i, g in enumerate(gain, start=1):
+                    self.tx_set(f"ACQ:SOUR{i}:GAIN", g.value)
+            if coupling is not None and siglab:
+                for i, c in enumerate(coupling, start=1):
+                    self.tx_set(f"ACQ:SOUR{i}:COUP", c.value)
 
         self.check_error()
 
@@ -1095,20 +1599,22 @@ class scpi (object):
 
         n = 4 if input4 else 2
 
-        settings = [
-            self.txrx_txt("ACQ:DEC:Factor?"),
-            self.txrx_txt("ACQ:AVG?"),
-            self.txrx_txt("ACQ:DATA:Units?"),
-            self.txrx_txt("ACQ:DATA:FORMAT?"),
-            self.txrx_txt("ACQ:BUF:SIZE?")
+        queries = [
+            "ACQ:DEC:Factor?",
+            "ACQ:AVG?",
+            "ACQ:DATA:Units?",
+            "ACQ:DATA:FORMAT?",
+            "ACQ:BUF:SIZE?"
         ]
 
         for i in range(n):
-            settings.append(self.txrx_txt(f"ACQ:SOUR{i+1}:GAIN?"))
+            queries.append(f"ACQ:SOUR{i+1}:GAIN?")
 
         if siglab:
             for i in range(2):
-                settings.append(self.txrx_txt(f"ACQ:SOUR{i+1}:COUP?"))
+                queries.append(f"ACQ:SOUR{i+1}:COUP?")
+
+        settings = self.query_many(queries)
         self.check_error()
 
         #? Remove prints? Repace with logging?
@@ -1194,21 +1700,22 @@ class scpi (object):
         """
         self._validate_acq_trig_params(trig_lvl, trig_delay, trig_hyst, ext_trig_deb_us, ext_trig_lvl, siglab, input4)
 
-        if trig_delay_ns:
-            self.tx_txt(f"ACQ:TRig:DLY:NS {trig_delay}")
-        else:
-            self.tx_txt(f"ACQ:TRig:DLY {trig_delay}")
+        with self.batch():
+            if trig_delay_ns:
+                self.tx_txt(f"ACQ:TRig:DLY:NS {trig_delay}")
+            else:
+                self.tx_set("ACQ:TRIG:DLY", trig_delay)
 
-        if trig_hyst is not None:
-            self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
+            if trig_hyst is not None:
+                self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
 
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        self.tx_txt(f"ACQ:TRig:LEV {trig_lvl}")
+            self.tx_set("ACQ:TRIG:LEV", trig_lvl)
 
-        if siglab and ext_trig_lvl is not None:
-            self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
+            if siglab and ext_trig_lvl is not None:
+                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
 
         self.check_error()
 
@@ -1234,16 +1741,18 @@ class scpi (object):
                 Defaults to False.
 
         """
-        settings = [
-            self.txrx_txt("ACQ:TRig:DLY?"),
-            self.txrx_txt("ACQ:TRig:DLY:NS?"),
-            self.txrx_txt("ACQ:TRig:LEV?"),
-            self.txrx_txt("ACQ:TRig:HYST?"),
-            self.txrx_txt("ACQ:TRig:EXT:DEBouncer:US?")
+        queries = [
+            "ACQ:TRig:DLY?",
+            "ACQ:TRig:DLY:NS?",
+            "ACQ:TRig:LEV?",
+            "ACQ:TRig:HYST?",
+            "ACQ:TRig:EXT:DEBouncer:US?"
         ]
 
         if siglab:
-            settings.append(self.txrx_txt("TRig:EXT:LEV?"))
+            queries.append("TRig:EXT:LEV?")
+
+        settings = self.query_many(queries)
 
         self.check_error()
 
@@ -1293,14 +1802,15 @@ class scpi (object):
         """# type: ignore
         self._validate_acq_trig_ext_hyst_params(trig_hyst, ext_trig_deb_us, ext_trig_lvl, siglab)
 
-        if trig_hyst is not None:
-            self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
+        with self.batch():
+            if trig_hyst is not None:
+                self.tx_txt(f"ACQ:TRig:HYST {trig_hyst}")
 
-        if ext_trig_deb_us is not None:
-            self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
+            if ext_trig_deb_us is not None:
+                self.tx_txt(f"ACQ:TRig:EXT:DEBouncer:US {ext_trig_deb_us}")
 
-        if siglab and ext_trig_lvl is not None:
-            self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
+            if siglab and ext_trig_lvl is not None:
+                self.tx_txt(f"TRig:EXT:LEV {ext_trig_lvl}")
         self.check_error()
 
     # Misc
@@ -1323,10 +1833,11 @@ class scpi (object):
                 Defaults to "ASCII".
         """
         self._validate_units_format(units, data_format)
-        if units is not None:
-            self.tx_txt(f"ACQ:DATA:Units {units.value}")
-        if data_format is not None:
-            self.tx_txt(f"ACQ:DATA:FORMAT {data_format.value}")
+        with self.batch():
+            if units is not None:
+                self.tx_set("ACQ:DATA:Units", units.value)
+            if data_format is not None:
+                self.tx_set("ACQ:DATA:FORMAT", data_format.value)
 
         self.check_error()
 
@@ -1397,12 +1908,13 @@ class scpi (object):
         """
         self._validate_acq_split_params(chan, dec, gain, coupling, siglab, input4)
 
-        self.tx_txt(f"ACQ:DEC:Factor:CH{chan} {dec}")
-        self.tx_txt(f"ACQ:AVG:CH{chan} {'ON' if averaging else 'OFF'}")
-        if gain is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:GAIN {gain.value}")
-        if siglab and coupling is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:COUP {coupling.value}")
+        with self.batch():
+            self.tx_txt(f"ACQ:DEC:Factor:CH{chan} {dec}")
+            self.tx_txt(f"ACQ:AVG:CH{chan} {'ON' if averaging else 'OFF'}")
+            if gain is not None:
+                self.tx_txt(f"ACQ:SOUR{chan}:GAIN {gain.value}")
+            if siglab and coupling is not None:
+                self.tx_txt(f"ACQ:SOUR{chan}:COUP {coupling.value}")
 
         self.check_error()
 
@@ -1442,12 +1954,13 @@ class scpi (object):
         """
         self._validate_acq_split_trig_params(chan, trig_lvl, trig_delay, trig_delay_ns, input4) # type: ignore
 
-        if trig_delay_ns:
-            self.tx_txt(f"ACQ:TRig:DLY:NS:CH{chan} {trig_delay}")
-        else:
-            self.tx_txt(f"ACQ:TRig:DLY:CH{chan} {trig_delay}")
+        with self.batch():
+            if trig_delay_ns:
+                self.tx_txt(f"ACQ:TRig:DLY:NS:CH{chan} {trig_delay}")
+            else:
+                self.tx_txt(f"ACQ:TRig:DLY:CH{chan} {trig_delay}")
 
-        self.tx_txt(f"ACQ:TRig:LEV:CH{chan} {trig_lvl}")
+            self.tx_txt(f"ACQ:TRig:LEV:CH{chan} {trig_lvl}")
         self.check_error()
 
     # Get data from RP
@@ -1460,7 +1973,8 @@ class scpi (object):
         old: bool = False,
         last: bool = False,
         trig_pos: Optional[DataTriggerPosition] = None,
-        input4: bool = False
+        input4: bool = False,
+        copy: bool = True
     ) -> np.ndarray:
         """
         Returns the acquired data on a channel from the Red Pitaya, with the following options (for a specific channel):
@@ -1501,50 +2015,181 @@ class scpi (object):
             input4 (bool, optional) :
                 Set to True if operating with STEMlab 125-14 4-Input.
                 Defaults to False.
+            copy (bool, optional) :
+                Return an array owned by the caller. With False, binary data is returned
+                as a view on the connection buffer pool, overwritten after `arb_pool_size`
+                further binary reads.
+                Defaults to True.
 
         Returns
         -------
             np.ndarray:
                 Numpy array with captured data.
         """
-        self._validate_acq_data_params(chan, start, end, num_samples, old, last, trig_pos, input4)
+        query = self._acq_data_query(chan, start, end, num_samples, old, last, trig_pos, input4)
 
-        # Determine the output data
-        if start is not None and end is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:STArt:End? {start},{end}")
-        elif start is not None and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:STArt:N? {start},{num_samples}")
-        elif old and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:Old:N? {num_samples}")
-        elif last and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:LATest:N? {num_samples}")
-        elif trig_pos is not None and num_samples is not None:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA:TRig? {num_samples},{trig_pos.value}")
-        else:
-            self.tx_txt(f"ACQ:SOUR{chan}:DATA?")
+        # Data type set by acq_set()/acq_set_units_format(), queried only while unknown
+        units, data_format = self._acq_data_type()
 
-        # Get data type from Red Pitaya
-        units = self.txrx_txt('ACQ:DATA:Units?')
-        data_format = self.txrx_txt("ACQ:DATA:FORMAT?")
-        self.check_error()
+        self.tx_txt(query)
 
         #! Check if data_format is correct
         # Convert data
         if data_format == "BIN":
-            buff_byte = self.rx_arb()
             if units == "VOLTS":
-                buff = np.frombuffer(buff_byte, dtype='>f4') # type: ignore
+                buff = self.rx_arb(dtype='>f4')
                 #buff = [struct.unpack('!f',bytearray(buff_byte[i:i+4]))[0] for i in range(0, len(buff_byte), 4)]
             elif units == "RAW":
-                buff = np.frombuffer(buff_byte, dtype='>i2') # type: ignore
+                buff = self.rx_arb(dtype='>i2')
                 #buff = [struct.unpack('!h',bytearray(buff_byte[i:i+2]))[0] for i in range(0, len(buff_byte), 2)]
+            if copy and buff is not False:
+                buff = buff.copy()
         else:
-            buff_string = self.rx_txt().strip('{}\n\r').replace("  ", "").split(',') # type: ignore
-            buff = np.array(buff_string).astype(np.float64)
+            buff = parse_ascii_array(self.rx_txt_bytes())
         self.check_error()
 
         return buff # type: ignore
 
+    def acq_data_multi(
+        self,
+        channels: Sequence[int] = (1, 2),
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+        num_samples: Optional[int] = None,
+        old: bool = False,
+        last: bool = False,
+        trig_pos: Optional[DataTriggerPosition] = None,
+        input4: bool = False,
+        out: Optional[np.ndarray] = None,
+        then: Optional[List[str]] = None
+    ) -> AcqData:
+        """
+        Returns the acquired data of several channels from the Red Pitaya in one
+        `(channels, samples)` array. All data queries leave in a single write and
+        each reply is received straight into its row of the array.
+
+        Parameters
+        ----------
+            channels (Sequence[int], optional):
+                Channels to read, in row order.
+                Defaults to (1, 2).
+            out (np.ndarray, optional):
+                Array from a previous call to receive into. A new array is allocated
+                when it is missing or its shape or dtype do not match.
+                Defaults to None.
+            then (List[str], optional):
+                Commands sent in the same write right after the data queries, e.g.
+                ["ACQ:START", "ACQ:TRIG CH1_PE"] to capture the next frame while this
+                one is downloaded. The server runs them after copying the data.
+                Defaults to None.
+
+            See ``acq_data()`` for the description of the other parameters.
+
+        Returns
+        -------
+            AcqData:
+                `data` array (wire dtype '>f4'/'>i2' in binary format, float64 in ASCII),
+                `channels`, `units` and `data_format`.
+        """
+        channels = tuple(channels)
+        queries = [self._acq_data_query(chan, start, end, num_samples, old, last, trig_pos, input4) for chan in channels]
+
+        units, data_format = self._acq_data_type()
+
+        self.tx_many(queries + list(then or []))
+
+        # Every reply is received before raising, so the connection stays in sync
+        error = None
+        if data_format == "BIN":
+            dtype = np.dtype('>f4' if units == "VOLTS" else '>i2')
+            out = self._acq_out(out, len(channels), dtype)
+            sized = False                   # `out` checked against the length of a block
+            for i, chan in enumerate(channels):
+                numOfBytes = self._rx_arb_len()
+                if numOfBytes is False:
+                    self._rx_skip_reply()
+                    error = error or ValueError(f"Invalid binary block for channel {chan}")
+                    continue
+                t0 = time.perf_counter()
+                shape = (len(channels), numOfBytes // dtype.itemsize)
+                if not sized:
+                    sized = True
+                    if out is None or out.shape != shape:
+                        out = np.empty(shape, dtype=dtype)
+                if out.shape[1] * dtype.itemsize == numOfBytes: # type: ignore
+                    self._rx_into(memoryview(out[i].view(np.uint8))) # type: ignore
+                else:
+                    self._rx_into(self._rx_pool.get(numOfBytes))
+                    error = error or ValueError(f"Channel {chan} returned {numOfBytes} bytes instead of {out.shape[1] * dtype.itemsize}") # type: ignore
+                self._rx_take(2)            # recive \r\n
+                if self.stats is not None:
+                    self.stats.arb_received(numOfBytes, time.perf_counter() - t0)
+        else:
+            replies = [self.rx_txt_bytes() for _ in channels]
+            out = self._acq_out(out, len(channels), np.dtype(np.float64))
+            sized = False
+            for i, (chan, reply) in enumerate(zip(channels, replies)):
+                try:
+                    values = parse_ascii_array(reply)
+                except ValueError as e:
+                    error = error or e
+                    continue
+                if not sized:
+                    sized = True
+                    if out is None or out.shape != (len(channels), len(values)):
+                        out = np.empty((len(channels), len(values)), dtype=np.float64)
+                if len(values) == out.shape[1]:
+                    out[i] = values
+                else:
+                    error = error or ValueError(f"Channel {chan} returned {len(values)} samples instead of {out.shape[1]}")
+        self.check_error()
+        if error is not None:
+            raise error
+
+        return AcqData(out, channels, units, data_format) # type: ignore
+
+    @staticmethod
+    def _acq_out(out, rows, dtype):
+        """`out` if it can receive `rows` channels of `dtype`, else None to allocate a new array."""
+        if out is None or out.ndim != 2 or out.shape[0] != rows or out.dtype != dtype or not out.flags.c_contiguous:
+            return None
+        return out
+
+    def _acq_data_type(self):
+        """Return the (units, data_format) of acquired data, querying only the unknown ones."""
+        units, data_format = self.query_cached_many(["ACQ:DATA:UNITS", "ACQ:DATA:FORMAT"])
+        return units.upper(), data_format.upper()
+
+    # Command builders
+    def _acq_data_query(
+        self,
+        chan: int,
+        start: Optional[int],
+        end: Optional[int],
+        num_samples: Optional[int],
+        old: bool,
+        last: bool,
+        trig_pos: Optional[DataTriggerPosition],
+        input4: bool
+    ) -> str:
+        """
+        Validate parameters for acq_data function and return the data query.
+        """
+        self._validate_acq_data_params(chan, start, end, num_samples, old, last, trig_pos, input4)
+
+        # Determine the output data
+        if start is not None and end is not None:
+            return f"ACQ:SOUR{chan}:DATA:STArt:End? {start},{end}"
+        elif start is not None and num_samples is not None:
+            return f"ACQ:SOUR{chan}:DATA:STArt:N? {start},{num_samples}"
+        elif old and num_samples is not None:
+            return f"ACQ:SOUR{chan}:DATA:Old:N? {num_samples}"
+        elif last and num_samples is not None:
+            return f"ACQ:SOUR{chan}:DATA:LATest:N? {num_samples}"
+        elif trig_pos is not None and num_samples is not None:
+            return f"ACQ:SOUR{chan}:DATA:TRig? {num_samples},{trig_pos.value}"
+        return f"ACQ:SOUR{chan}:DATA?"
+
     # Validations
     def _validate_acq_set_params(
         self,
@@ -1607,7 +2252,7 @@ class scpi (object):
         """
         Validate parameters for acq_trig_set function.
         """
-        trig_lvl_lim = 20.0 if any(self.txrx_txt(f"ACQ:SOUR{i+1}:GAIN?").upper() == "HV" for i in range(4 if input4 else 2)) else 1.0 # type: ignore
+        trig_lvl_lim = 20.0 if any(g.upper() == "HV" for g in self.query_many([f"ACQ:SOUR{i+1}:GAIN?" for i in range(4 if input4 else 2)])) else 1.0
         ext_trig_lvl_limit = 5.0
 
         assert abs(trig_lvl) <= trig_lvl_lim, f"Trigger level out of range {-trig_lvl_lim, trig_lvl_lim} V"
@@ -1750,12 +2395,13 @@ class scpi (object):
         """
         self._validate_uart_params(speed, bits, parity, stop, timeout)
 
-        self.tx_txt("UART:INIT")
-        self.tx_txt(f"UART:SPEED {speed}")
-        self.tx_txt(f"UART:BITS {bits.value}")
-        self.tx_txt(f"UART:STOPB STOP{stop}")
-        self.tx_txt(f"UART:PARITY {parity.value}")
-        self.tx_txt(f"UART:TIMEOUT {timeout}")
+        with self.batch():
+            self.tx_txt("UART:INIT")
+            self.tx_txt(f"UART:SPEED {speed}")
+            self.tx_txt(f"UART:BITS {bits.value}")
+            self.tx_txt(f"UART:STOPB STOP{stop}")
+            self.tx_txt(f"UART:PARITY {parity.value}")
+            self.tx_txt(f"UART:TIMEOUT {timeout}")
 
     def uart_get_settings(self) -> List[str | None]:
         """
@@ -1763,13 +2409,13 @@ class scpi (object):
         them as an array with the following sequence:
         [speed, databits, stopbits, parity, timeout]
         """
-        settings = [
-            self.txrx_txt("UART:SPEED?"),
-            self.txrx_txt("UART:BITS?"),
-            self.txrx_txt("UART:STOPB?"),
-            self.txrx_txt("UART:PARITY?"),
-            self.txrx_txt("UART:TIMEOUT?")
-        ]
+        settings = self.query_many([
+            "UART:SPEED?",
+            "UART:BITS?",
+            "UART:STOPB?",
+            "UART:PARITY?",
+            "UART:TIMEOUT?"
+        ])
         #? Remove prints? Repace with logging?
         print(f"Baudrate/Speed: {settings[0]}")
         print(f"Databits: {settings[1]}")
@@ -1803,8 +2449,8 @@ class scpi (object):
         assert length > 0, "Length must be greater than 0."
 
         self.tx_txt(f"UART:READ{length}?")
-        res = self.rx_txt().strip('{}\n\r').replace("  ", "").split(',') # type: ignore
-        string = "".join(chr(int(x)) for x in res)  # int(x).decode("utf8")
+        res = parse_ascii_array(self.rx_txt_bytes(), dtype=np.int64)
+        string = res.astype(np.uint8).tobytes().decode('latin-1')   # chr() of every byte value
 
         return string
 
@@ -1906,13 +2552,13 @@ class scpi (object):
         [mode, csmode, speed, word_len, msg_size]
         """
         self.tx_txt("SPI:SETtings:GET")
-        settings = [
-            self.txrx_txt("SPI:SETtings:MODE?"),
-            self.txrx_txt("SPI:SETtings:CSMODE?"),
-            self.txrx_txt("SPI:SETtings:SPEED?"),
-            self.txrx_txt("SPI:SETtings:WORD?"),
-            self.txrx_txt("SPI:MSG:SIZE?")
-        ]
+        settings = self.query_many([
+            "SPI:SETtings:MODE?",
+            "SPI:SETtings:CSMODE?",
+            "SPI:SETtings:SPEED?",
+            "SPI:SETtings:WORD?",
+            "SPI:MSG:SIZE?"
+        ])
 
         print(f"SPI mode: {settings[0]}")
         print(f"CS mode: {settings[1]}")
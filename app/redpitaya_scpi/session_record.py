@@ -0,0 +1,170 @@
+"""
+Recording of SCPI sessions and deterministic replay without hardware.
+
+A session file holds every chunk written to and read from the socket, with its
+timestamp, so text replies and binary blocks are reproduced byte for byte.
+
+Record on a live connection:
+
+    rp = scpi.scpi('rp-xxxxxx.local')
+    rp.start_recording('session.rps')
+    ...
+    rp.stop_recording()
+
+Replay it later, at the original speed or faster (speed=None replays without waiting):
+
+    rp = replay_scpi('session.rps', speed=10.0)
+    data = ScpiData('replay', rp=rp)
+"""
+
+import gzip
+import struct
+import time
+from typing import List, Optional, Tuple
+
+MAGIC = b'RPSCPI1\n'
+
+SENT = 0
+RECEIVED = 1
+
+# kind, seconds since the start of the recording, payload length
+_RECORD = struct.Struct('<BdI')
+
+
+def write_records(f, records: List[Tuple[int, float, bytes]]):
+    """Write (kind, time, payload) records to an open session file."""
+    for kind, t, payload in records:
+        f.write(_RECORD.pack(kind, t, len(payload)))
+        f.write(payload)
+
+
+def read_session(path: str) -> List[Tuple[int, float, bytes]]:
+    """Return the (kind, time, payload) records of a session file."""
+    records = []
+    with gzip.open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a SCPI session file")
+        while 1:
+            header = f.read(_RECORD.size)
+            if not header:
+                break
+            kind, t, length = _RECORD.unpack(header)
+            records.append((kind, t, f.read(length)))
+    return records
+
+
+class RecordingSocket(object):
+    """Socket wrapper writing every sent and received chunk to a session file."""
+
+    def __init__(self, sock, path: str):
+        self._sock = sock
+        self.path = path
+        self._file = gzip.open(path, 'wb', compresslevel=1)
+        self._file.write(MAGIC)
+        self._t0 = time.perf_counter()
+
+    def _record(self, kind: int, payload: bytes):
+        write_records(self._file, [(kind, time.perf_counter() - self._t0, payload)])
+
+    def sendall(self, data):
+        self._record(SENT, bytes(data))
+        return self._sock.sendall(data)
+
+    def recv(self, bufsize: int):
+        data = self._sock.recv(bufsize)
+        self._record(RECEIVED, data)
+        return data
+
+    def recv_into(self, buffer, nbytes: int = 0):
+        n = self._sock.recv_into(buffer, nbytes)
+        self._record(RECEIVED, bytes(memoryview(buffer)[:n]))
+        return n
+
+    def stop(self):
+        """Close the session file, the socket stays open."""
+        if not self._file.closed:
+            self._file.close()
+
+    def close(self):
+        self.stop()
+        self._sock.close()
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+
+class ReplaySocket(object):
+    """Socket-like object serving the replies of a recorded session.
+    Each reply is delayed by its recorded time after the preceding write, divided by
+    `speed` (None replays without waiting). Sent data is only compared to the recording
+    when `strict` is set, in which case a mismatch raises ValueError."""
+
+    def __init__(self, path: str, speed: Optional[float] = 1.0, strict: bool = False):
+        self.path = path
+        self.speed = speed
+        self.strict = strict
+
+        self._records = read_session(path)
+        self._next = 0
+        self._pending = b''                 # Rest of a recorded chunk partially read
+        self._anchor_rec = 0.0              # Recorded time of the last write
+        self._anchor_wall = time.perf_counter()
+        self.closed = False
+
+    def sendall(self, data):
+        data = bytes(data)
+        sent = b''
+        while len(sent) < len(data) and self._next < len(self._records):
+            kind, t, payload = self._records[self._next]
+            if kind != SENT:
+                break
+            self._next += 1
+            sent += payload
+            self._anchor_rec = t
+        self._anchor_wall = time.perf_counter()
+
+        if self.strict and sent != data:
+            raise ValueError(f"Replay mismatch: sent {data[:60]!r}, recorded {sent[:60]!r}")
+
+    def _next_reply(self) -> bytes:
+        while self._next < len(self._records):
+            kind, t, payload = self._records[self._next]
+            self._next += 1
+            if kind != RECEIVED:
+                if self.strict:
+                    raise ValueError(f"Replay mismatch: reply expected, recorded write {payload[:60]!r}")
+                continue
+            if self.speed:
+                delay = self._anchor_wall + (t - self._anchor_rec) / self.speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            return payload
+        return b''                          # End of the recording reads as a closed connection
+
+    def recv(self, bufsize: int) -> bytes:
+        if not self._pending:
+            self._pending = self._next_reply()
+        data = self._pending[:bufsize]
+        self._pending = self._pending[bufsize:]
+        return data
+
+    def recv_into(self, buffer, nbytes: int = 0) -> int:
+        view = memoryview(buffer)
+        data = self.recv(nbytes or len(view))
+        view[:len(data)] = data
+        return len(data)
+
+    def settimeout(self, timeout):
+        pass
+
+    def setsockopt(self, *args):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def replay_scpi(path: str, speed: Optional[float] = 1.0, strict: bool = False, **kwargs):
+    """Return a `scpi` client connected to the replay of the session at `path`."""
+    from app.redpitaya_scpi.redpitaya_scpi import scpi
+    return scpi(f"replay:{path}", sock=ReplaySocket(path, speed, strict), **kwargs)
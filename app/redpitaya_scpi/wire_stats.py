@@ -0,0 +1,186 @@
+"""
+Wire-level counters and round-trip histograms for the SCPI transport.
+"""
+
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+HIST_BUCKETS = 32       # Bucket i counts round trips in [2**(i-1), 2**i) microseconds
+
+
+class WireStats(object):
+    """Counters of one scpi connection.
+    Round-trip times are kept per query header (e.g. 'ACQ:TRIG:FILL?') as log2 histograms
+    in microseconds. A query is timed from the write that sent it to the end of its reply."""
+
+    def __init__(self, log_interval: Optional[float] = None):
+        """If `log_interval` is set, a summary line is printed at most every `log_interval` seconds."""
+        self.log_interval = log_interval
+        self.reset()
+
+    def reset(self):
+        """Clear all counters."""
+        self.started = time.monotonic()
+        self._last_log = self.started
+
+        self.commands = 0
+        self.queries = 0
+        self.bytes_tx = 0
+        self.bytes_rx = 0
+        self.send_calls = 0
+        self.recv_calls = 0
+
+        self.arb_blocks = 0
+        self.arb_bytes = 0
+        self.arb_time = 0.0
+
+        self.check_error_calls = 0
+        self.check_error_time = 0.0
+
+        self._rtt_hist: Dict[str, List[int]] = {}
+        self._rtt_sum: Dict[str, float] = {}
+        self._rtt_max: Dict[str, float] = {}
+        self._pending: Deque[list] = deque()      # [header, send time] of queries without reply yet
+
+    # Hooks called by scpi
+
+    def command_sent(self, msg: str, queued: bool = False):
+        """Count a command. Queued commands are timed from the next flushed()."""
+        self.commands += 1
+        header = msg.split(' ', 1)[0]
+        if header.endswith('?'):
+            self.queries += 1
+            self._pending.append([header.upper(), None if queued else time.perf_counter()])
+
+    def flushed(self):
+        """The queued commands were written."""
+        now = time.perf_counter()
+        for pending in reversed(self._pending):
+            if pending[1] is not None:
+                break
+            pending[1] = now
+
+    def reply_received(self):
+        """The reply of the oldest pending query was received."""
+        if self._pending:
+            header, sent = self._pending.popleft()
+            if sent is not None:
+                self._add_rtt(header, time.perf_counter() - sent)
+        self._maybe_log()
+
+    def arb_received(self, num_bytes: int, seconds: float):
+        """A binary block of `num_bytes` took `seconds` from its header to its last byte."""
+        self.arb_blocks += 1
+        self.arb_bytes += num_bytes
+        self.arb_time += seconds
+        self.reply_received()
+
+    def error_checked(self, seconds: float):
+        self.check_error_calls += 1
+        self.check_error_time += seconds
+
+    def _add_rtt(self, header: str, rtt: float):
+        hist = self._rtt_hist.get(header)
+        if hist is None:
+            hist = self._rtt_hist[header] = [0] * HIST_BUCKETS
+            self._rtt_sum[header] = 0.0
+            self._rtt_max[header] = 0.0
+        hist[min(int(rtt * 1e6).bit_length(), HIST_BUCKETS - 1)] += 1
+        self._rtt_sum[header] += rtt
+        if rtt > self._rtt_max[header]:
+            self._rtt_max[header] = rtt
+
+    # Reporting
+
+    @staticmethod
+    def _percentile_us(hist: List[int], q: float) -> int:
+        """Upper bound of the histogram bucket holding the `q` quantile."""
+        target = q * sum(hist)
+        count = 0
+        for i, n in enumerate(hist):
+            count += n
+            if count >= target:
+                return 2**i
+        return 2**(len(hist) - 1)
+
+    def snapshot(self) -> dict:
+        """Return the current counters as a dictionary."""
+        rtt = {}
+        for header, hist in self._rtt_hist.items():
+            count = sum(hist)
+            rtt[header] = {
+                "count": count,
+                "mean_us": self._rtt_sum[header] / count * 1e6,
+                "max_us": self._rtt_max[header] * 1e6,
+                "p50_us": self._percentile_us(hist, 0.5),
+                "p99_us": self._percentile_us(hist, 0.99),
+                "histogram": {2**i: n for i, n in enumerate(hist) if n},
+            }
+
+        return {
+            "elapsed": time.monotonic() - self.started,
+            "commands": self.commands,
+            "queries": self.queries,
+            "bytes_tx": self.bytes_tx,
+            "bytes_rx": self.bytes_rx,
+            "send_calls": self.send_calls,
+            "recv_calls": self.recv_calls,
+            "arb_blocks": self.arb_blocks,
+            "arb_bytes": self.arb_bytes,
+            "arb_mbps": self.arb_bytes * 8 / self.arb_time / 1e6 if self.arb_time else 0.0,
+            "check_error_calls": self.check_error_calls,
+            "check_error_time": self.check_error_time,
+            "rtt": rtt,
+        }
+
+    def summary(self, top: int = 3) -> str:
+        """One line summary with the `top` most frequent queries."""
+        snap = self.snapshot()
+        line = (
+            f"SCPI {snap['elapsed']:.1f} s: {snap['commands']} cmd, {snap['queries']} qry, "
+            f"tx {snap['bytes_tx'] / 1e3:.1f} kB in {snap['send_calls']} sends, "
+            f"rx {snap['bytes_rx'] / 1e3:.1f} kB in {snap['recv_calls']} recvs, "
+            f"arb {snap['arb_mbps']:.1f} Mbit/s, "
+            f"check_error {snap['check_error_time'] * 1e3:.1f} ms/{snap['check_error_calls']}"
+        )
+        frequent = sorted(snap["rtt"].items(), key=lambda item: -item[1]["count"])[:top]
+        for header, r in frequent:
+            line += f"; {header} n={r['count']} mean={r['mean_us']:.0f}us p99<{r['p99_us']}us"
+        return line
+
+    def _maybe_log(self):
+        if self.log_interval is None:
+            return
+        now = time.monotonic()
+        if now - self._last_log >= self.log_interval:
+            self._last_log = now
+            print(self.summary())
+
+
+class CountingSocket(object):
+    """Socket wrapper counting the send/recv calls and bytes into a WireStats."""
+
+    def __init__(self, sock, stats: WireStats):
+        self._sock = sock
+        self.stats = stats
+
+    def sendall(self, data):
+        self.stats.send_calls += 1
+        self.stats.bytes_tx += len(data)
+        return self._sock.sendall(data)
+
+    def recv(self, bufsize: int):
+        data = self._sock.recv(bufsize)
+        self.stats.recv_calls += 1
+        self.stats.bytes_rx += len(data)
+        return data
+
+    def recv_into(self, buffer, nbytes: int = 0):
+        n = self._sock.recv_into(buffer, nbytes)
+        self.stats.recv_calls += 1
+        self.stats.bytes_rx += n
+        return n
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
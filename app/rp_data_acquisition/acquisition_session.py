@@ -0,0 +1,164 @@
+import threading
+
+from app.rp_data_acquisition.scpi_data import ScpiData, plan_fetch
+
+# Session parameter -> (SCPI header, conversion of the value)
+_SETTINGS = {
+    "data_format": ("ACQ:DATA:FORMAT", lambda v: str(v).upper()),
+    "data_units": ("ACQ:DATA:UNITS", lambda v: str(v).upper()),
+    "decimation": ("ACQ:DEC", int),
+    "trigger_delay": ("ACQ:TRIG:DLY", int),
+    "trigger_level": ("ACQ:TRIG:LEV", float),
+}
+
+# Session parameters and their defaults
+DEFAULT_PARAMS = dict(
+    decimation=8,
+    trigger_level=0.0,
+    trigger_delay=0,
+    trigger_source="CH1_PE",
+    data_units="Volts",
+    data_format="bin",
+    x_range=None,
+)
+
+
+class AcquisitionSession:
+    """
+    Repeated acquisitions on a ScpiData connection.
+
+    The acquisition is reset and configured once; after that each frame only re-arms
+    the board (ACQ:START + ACQ:TRIG) and sends the parameters changed with update().
+    The session configures itself again when the ScpiData reconnects.
+
+    With `overlapped`, the next frame is armed in the same write as the data queries of
+    the current one, so the board fills the next buffer while the host downloads.
+
+    `params` are the session parameters of DEFAULT_PARAMS. `x_range` (start, end) in µs
+    limits the download to the samples in that time range, see plan_fetch(); None reads
+    the whole buffer.
+    """
+    def __init__(self, data: ScpiData, channels=(1, 2), timeout=5.0, overlapped=False, **params):
+        self.data = data
+        self.params = self.default_params(**params)
+        self.channels = tuple(channels)
+        self.timeout = timeout
+        self.overlapped = overlapped
+        self.frames = 0
+        self._armed = False             # Next frame already armed by the previous fetch
+        self._armed_params = {}         # Parameters the armed frame was configured with
+
+        self._dirty = set(_SETTINGS)
+        self._rp = None                 # scpi client the session is configured on
+        self._lock = threading.Lock()   # update() may come from another thread
+
+    @staticmethod
+    def default_params(**params):
+        """DEFAULT_PARAMS with `params` applied, ValueError for an unknown parameter."""
+        for name in params:
+            if name not in DEFAULT_PARAMS:
+                raise ValueError(f"Unknown acquisition parameter: {name}")
+        return dict(DEFAULT_PARAMS, **params)
+
+    def update(self, **params):
+        """Change acquisition parameters, they are sent with the next frame."""
+        with self._lock:
+            for name, value in params.items():
+                if name not in self.params:
+                    raise ValueError(f"Unknown acquisition parameter: {name}")
+                if self.params[name] != value:
+                    self.params[name] = value
+                    if name in _SETTINGS:
+                        self._dirty.add(name)
+
+    def arm(self):
+        """
+        Send the changed parameters, start the acquisition and arm the trigger in one write.
+        Returns the parameters the acquisition was armed with.
+        """
+        rp = self.data.rp
+        with self._lock:
+            params = dict(self.params)
+            if rp is not self._rp:
+                # New connection, start from a known state
+                dirty = set(_SETTINGS)
+            else:
+                dirty = set(self._dirty)
+
+        if params["data_format"].lower() not in ("ascii", "bin"):
+            raise ValueError(f"Formato desconocido: {params['data_format']}")
+
+        self.data.decimation = int(params["decimation"])
+        self.data.trigger_delay = int(params["trigger_delay"])
+
+        if rp is not self._rp:
+            with self.data.lock:
+                rp.tx_txt("ACQ:RST") # type: ignore
+
+        # RAW counts are scaled with the factors of the firmware's VOLTS, derived once per channel and gain
+        if params["data_units"].upper() == "RAW" and self.data.raw_to_volts and self.data.needs_raw_calibration(self.channels):
+            self.data.calibrate_raw(self.channels)
+            dirty = set(_SETTINGS)
+
+        with self.data.lock, rp.batch(): # type: ignore
+            for name in [name for name in _SETTINGS if name in dirty]:
+                header, convert = _SETTINGS[name]
+                rp.tx_set(header, convert(params[name])) # type: ignore
+            self.data.rearm(params["trigger_source"])
+
+        # Only once sent: when arm() raises, the changes are sent with the next frame.
+        # A parameter changed again meanwhile stays pending
+        with self._lock:
+            self._dirty -= {name for name in dirty if self.params[name] == params[name]}
+        self._rp = rp
+        self._armed = True
+        self._armed_params = params
+        return params
+
+    @staticmethod
+    def window(params):
+        """Part of the buffer read with the session parameters `params`, None for all of it."""
+        return plan_fetch(params["x_range"], params["decimation"], params["trigger_delay"])
+
+    def disarm(self):
+        """Forget the frame armed by overlapped capture, the next acquire() arms a fresh one."""
+        self._armed = False
+
+    def stop(self):
+        """Stop an acquisition left armed by overlapped capture."""
+        self.disarm()
+        self.data.stop_acquisition()
+
+    def acquire(self):
+        """
+        Acquire one frame.
+
+        Returns
+        -------
+        data : tuple of np.ndarray
+            acquired data, one array per channel of `channels`
+        params : dict
+            the parameters the frame was armed and read with
+        """
+        with self._lock:
+            # x_range only selects what is read, a change does not need a new acquisition
+            current = {name: value for name, value in self.params.items() if name != "x_range"}
+            armed = {name: value for name, value in self._armed_params.items() if name != "x_range"}
+            rearm = not (self._armed and self.data.rp is self._rp and current == armed)
+        params = self.arm() if rearm else self._armed_params
+
+        self._armed = False
+        self.data.wait_fill(self.timeout)
+
+        with self._lock:
+            params = dict(params, x_range=self.params["x_range"])
+        window = self.window(params)
+        if self.overlapped:
+            # The next frame is armed with the same parameters
+            data = self.data.fetch(self.channels, rearm_source=params["trigger_source"], window=window)
+            self._armed = True
+            self._armed_params = params
+        else:
+            data = self.data.fetch(self.channels, window=window)
+        self.frames += 1
+        return data, params
@@ -0,0 +1,158 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from app.rp_data_acquisition.frame_averager import FrameAverager
+
+
+class Frame(NamedTuple):
+    """One acquired frame."""
+    seq: int                        # Increases by one per acquired frame
+    timestamp: float                # Host time when the frame was read
+    data: Tuple[np.ndarray, ...]    # One array per channel
+    settings: dict                  # Session parameters the frame was acquired with
+
+
+class FrameRing:
+    """Fixed-size ring of frames, the oldest frame is dropped when a new one does not fit."""
+    def __init__(self, size=4):
+        self._frames = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def put(self, frame: Frame):
+        with self._lock:
+            if len(self._frames) == self._frames.maxlen:
+                self.dropped += 1
+            self._frames.append(frame)
+
+    def latest(self) -> Optional[Frame]:
+        """Newest frame, or None if no frame was acquired yet."""
+        with self._lock:
+            return self._frames[-1] if self._frames else None
+
+    def pop_oldest(self) -> Optional[Frame]:
+        """Remove and return the oldest frame, for consumers that need every frame."""
+        with self._lock:
+            return self._frames.popleft() if self._frames else None
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+
+    def __len__(self):
+        return len(self._frames)
+
+
+class RateMeter:
+    """Events per second, smoothed over roughly the last `smoothing` events."""
+    def __init__(self, smoothing=10):
+        self.smoothing = smoothing
+        self.count = 0
+        self._last = None
+        self._interval = 0.0
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last is not None:
+            dt = now - self._last
+            alpha = 1.0 / min(self.count, self.smoothing)
+            self._interval += alpha * (dt - self._interval)
+        self._last = now
+        self.count += 1
+
+    @property
+    def rate(self) -> float:
+        return 1.0 / self._interval if self._interval > 0 else 0.0
+
+
+class AcquisitionWorker:
+    """
+    Acquires frames from an AcquisitionSession on a background thread into a FrameRing,
+    so the display reads the newest frame without waiting for the board.
+    `enabled` is polled between frames, the worker idles while it returns False.
+    Every acquired frame is also added to `averager` (a FrameAverager), if given; while
+    it averages more than one frame, the ring receives the mean instead of single shots.
+    `ring` replaces the FrameRing of `ring_size` frames, e.g. with a SharedFrameRing.
+    The means are written into ring_size + 1 buffers in turn, so a frame's arrays stay
+    valid until ring_size frames later; copy them to keep them longer.
+    """
+    def __init__(self, session, ring_size=4, enabled: Optional[Callable[[], bool]] = None, idle_time=0.05, error_backoff=0.5, averager=None, ring=None):
+        self.session = session
+        self.averager = averager
+        self.ring = ring if ring is not None else FrameRing(ring_size)
+        self._ring_size = ring_size
+        self._means: Optional[np.ndarray] = None    # Output buffers of the averager
+        self.enabled = enabled or (lambda: True)
+        self.idle_time = idle_time
+        self.error_backoff = error_backoff
+
+        self.acq_rate = RateMeter()
+        self.last_error: Optional[Exception] = None
+
+        self._seq = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="AcquisitionWorker", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the frame in progress, waiting at most `timeout` seconds."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+
+    def latest(self) -> Optional[Frame]:
+        return self.ring.latest()
+
+    def configure_averaging(self, count=None, mode=None):
+        """Average `count` frames, see FrameAverager."""
+        if self.averager is None:
+            self.averager = FrameAverager()
+        self.averager.configure(count=count, mode=mode)
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.enabled():
+                # A frame armed before pausing would be stale when resuming
+                self.session.disarm()
+                self._stop.wait(self.idle_time)
+                continue
+
+            try:
+                data, settings = self.session.acquire()
+            except Exception as e:
+                # Report each kind of error once, then keep retrying
+                if repr(e) != repr(self.last_error):
+                    print("Acquisition error:", e)
+                self.last_error = e
+                self._stop.wait(self.error_backoff)
+                continue
+
+            self.last_error = None
+            if self.averager is not None:
+                self.averager.add(data, settings)
+                if self.averager.count > 1:
+                    data = self.averager.mean(self._mean_buffer(data)) or data
+            self.ring.put(Frame(self._seq, time.time(), data, settings))
+            self._seq += 1
+            self.acq_rate.tick()
+
+    def _mean_buffer(self, data) -> np.ndarray:
+        shape = (len(data), len(data[0]))
+        if self._means is None or self._means.shape[1:] != shape:
+            self._means = np.empty((self._ring_size + 1,) + shape, dtype=np.float32)
+        return self._means[self._seq % len(self._means)]
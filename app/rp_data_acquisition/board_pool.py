@@ -0,0 +1,175 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.redpitaya_scpi.redpitaya_scpi import ScpiError
+from app.rp_data_acquisition.scpi_data import ScpiData
+
+# Errors of one board that must not stop the acquisition of the others
+BOARD_ERRORS = (OSError, TimeoutError, ScpiError, ValueError)
+
+
+class MultiBoardFrame(NamedTuple):
+    """One acquisition of every board of a BoardPool."""
+    timestamp: float                            # Host time when the last board was armed
+    data: Dict[str, Tuple[np.ndarray, ...]]     # Board address -> one array per channel
+    armed_at: Dict[str, float]                  # Board address -> host time its trigger was armed
+    skew: float                                 # Spread of the arming times in seconds
+    errors: Dict[str, Exception]                # Board address -> error of the boards without data
+
+
+class BoardPool:
+    """
+    Keeps one persistent ScpiData connection per Red Pitaya and acquires from all of
+    them in parallel. Socket I/O releases the GIL, so each board waits on its own
+    thread and the frame time does not grow with the number of boards.
+    """
+    def __init__(self, addresses: Sequence[str], port=5000, nodelay=True, max_workers: Optional[int] = None):
+        """Boards that can not be reached are left out of the pool, with their error in `failed`."""
+        self.port = port
+        self.nodelay = nodelay
+        self.boards: Dict[str, ScpiData] = {}
+        self.failed: Dict[str, Exception] = {}
+        self._workers = max_workers or max(len(addresses), 1)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers)
+
+        # Connect to all the boards at once
+        futures = {address: self._executor.submit(self._open, address) for address in addresses}
+        for address, future in futures.items():
+            try:
+                self.boards[address] = future.result()
+            except BOARD_ERRORS as e:
+                print(f"Red Pitaya {address} left out of the pool:", e)
+                self.failed[address] = e
+
+    def _open(self, address: str) -> ScpiData:
+        # 'host:port' overrides the pool port
+        host, _, port = address.partition(':')
+        board = ScpiData(host, port=int(port) if port else self.port, nodelay=self.nodelay)
+        # scpi prints instead of raising when the connection fails
+        if not board.is_rp_connected():
+            board.close()
+            raise ConnectionError(f"Red Pitaya {address} not connected")
+        return board
+
+    def __getitem__(self, address: str) -> ScpiData:
+        return self.boards[address]
+
+    def __len__(self):
+        return len(self.boards)
+
+    def add(self, address: str) -> ScpiData:
+        """Connect to another board, or return the open connection to it. Raises ConnectionError if it can not be reached."""
+        if address not in self.boards:
+            self.boards[address] = self._open(address)
+            self.failed.pop(address, None)
+            if self._workers < len(self.boards):
+                self._executor.shutdown(wait=True)
+                self._workers = len(self.boards)
+                self._executor = ThreadPoolExecutor(max_workers=self._workers)
+        return self.boards[address]
+
+    def remove(self, address: str):
+        """Close the connection to a board and drop it from the pool."""
+        board = self.boards.pop(address, None)
+        if board is not None:
+            board.close()
+
+    def map(self, fn, *args, **kwargs) -> Dict[str, object]:
+        """Call fn(board, *args, **kwargs) on every board in parallel, returns the results by address."""
+        futures = {address: self._executor.submit(fn, board, *args, **kwargs) for address, board in self.boards.items()}
+        return {address: future.result() for address, future in futures.items()}
+
+    def _map_with_address(self, fn, *args) -> Dict[str, object]:
+        futures = {address: self._executor.submit(fn, board, address, *args) for address, board in self.boards.items()}
+        return {address: future.result() for address, future in futures.items()}
+
+    def _arm(self, board: ScpiData, address: str, trigger_sources, kwargs):
+        source = trigger_sources.get(address, kwargs.get("trigger_source", "CH1_PE"))
+        try:
+            board.arm(**dict(kwargs, trigger_source=source))
+        except BOARD_ERRORS as e:
+            return e
+        return time.time()
+
+    def _wait_fetch(self, board: ScpiData, timeout, channels):
+        try:
+            board.wait_fill(timeout)
+            return board.fetch(channels)
+        except BOARD_ERRORS as e:
+            return e
+
+    def _stop(self, board: ScpiData):
+        try:
+            board.stop_acquisition()
+        except BOARD_ERRORS as e:
+            print("Error stopping acquisition:", e)
+
+    def read_frames(self, trigger_sources: Optional[Dict[str, str]] = None, timeout=5.0, channels=(1, 2), **kwargs) -> MultiBoardFrame:
+        """
+        Acquire one frame from every board.
+
+        All boards are armed before any of them is read, so boards sharing a trigger
+        (e.g. daisy chained secondaries on 'EXT_PE') capture the same event.
+
+        Parameters
+        ----------
+        trigger_sources : dict, optional
+            board address -> trigger source, for boards that do not use `trigger_source`
+        timeout : float
+            seconds to wait for each board
+        channels : tuple of int
+            channels to read from every board
+        **kwargs :
+            acquisition parameters of ``ScpiData.arm()`` shared by all boards
+
+        Returns
+        -------
+        MultiBoardFrame
+            boards that failed to arm or read (e.g. trigger timeout) are in `errors`
+            instead of `data`
+        """
+        errors: Dict[str, Exception] = {}
+        try:
+            armed = self._map_with_address(self._arm, trigger_sources or {}, kwargs)
+            armed_at = {}
+            for address, result in armed.items():
+                if isinstance(result, Exception):
+                    errors[address] = result
+                else:
+                    armed_at[address] = result
+
+            data = {}
+            futures = {address: self._executor.submit(self._wait_fetch, self.boards[address], timeout, channels) for address in armed_at}
+            for address, future in futures.items():
+                result = future.result()
+                if isinstance(result, Exception):
+                    errors[address] = result
+                else:
+                    data[address] = result
+        finally:
+            # No board is left armed, whatever happened to the others
+            self.map(self._stop)
+
+        times = list(armed_at.values())
+        return MultiBoardFrame(
+            timestamp=max(times) if times else time.time(),
+            data=data, # type: ignore
+            armed_at=armed_at, # type: ignore
+            skew=max(times) - min(times) if times else 0.0,
+            errors=errors,
+        )
+
+    def close(self):
+        """Close every connection and stop the worker threads."""
+        for address in list(self.boards):
+            self.remove(address)
+        self._executor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,107 @@
+import threading
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class FrameAverager:
+    """
+    Running mean of acquired frames in a float32 accumulator updated in place.
+
+    mode "linear" is the mean of the last `count` frames, kept as a running sum with
+    the frames in a preallocated history; "exponential" weights the new frame by 1/count.
+    The history holds at most LINEAR_MAX frames (8 MiB for two full buffers), a larger
+    `count` averages exponentially. Averaging restarts when the frame shape or the
+    acquisition settings change. A `count` of 1 passes the frames through.
+    """
+    MODES = ("linear", "exponential")
+    LINEAR_MAX = 64
+
+    def __init__(self, count=1, mode="linear"):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}")
+        self.count = max(int(count), 1)
+        self.mode = mode
+        self.frames = 0                 # Frames in the current mean
+
+        self._acc: Optional[np.ndarray] = None
+        self._history: Optional[np.ndarray] = None     # Last `count` frames (linear mode)
+        self._scratch: Optional[np.ndarray] = None     # x - acc (exponential mode)
+        self._settings = None
+        self._lock = threading.Lock()   # add() runs on the acquisition thread, mean() on the display
+
+    def configure(self, count=None, mode=None):
+        """Change the number of frames or the mode, the mean restarts."""
+        with self._lock:
+            if mode is not None:
+                if mode not in self.MODES:
+                    raise ValueError(f"mode must be one of {self.MODES}")
+                self.mode = mode
+            if count is not None:
+                self.count = max(int(count), 1)
+            self._reset()
+
+    def reset(self):
+        with self._lock:
+            self._reset()
+
+    def _reset(self):
+        self.frames = 0
+        self._acc = None
+        self._history = None
+        self._scratch = None
+
+    def add(self, data, settings=None):
+        """Add a frame, one array per channel. `settings` differing from the previous frame's restart the mean."""
+        with self._lock:
+            shape = (len(data), len(data[0]))
+            if settings != self._settings or self._acc is None or self._acc.shape != shape:
+                self._settings = settings
+                self._reset()
+                self._acc = np.zeros(shape, dtype=np.float32)
+                if self.mode == "linear" and 1 < self.count <= self.LINEAR_MAX:
+                    self._history = np.empty((self.count,) + shape, dtype=np.float32)
+                else:
+                    self._scratch = np.empty(shape, dtype=np.float32)
+
+            acc = self._acc
+            k = self.frames
+            if self._history is not None:
+                # Sum of the last `count` frames: add the new one, drop the one it replaces
+                slot = self._history[k % self.count]
+                if k >= self.count:
+                    acc -= slot
+                for i, row in enumerate(data):
+                    slot[i] = row
+                acc += slot
+                # Float32 rounding accumulates in the running sum, sum it again once per cycle
+                if k % self.count == self.count - 1:
+                    np.sum(self._history, axis=0, out=acc)
+            else:
+                # Exponential (or count 1): acc += alpha * (x - acc), plain mean while warming up
+                alpha = 1.0 / min(k + 1, self.count)
+                scratch = self._scratch
+                for i, row in enumerate(data):
+                    np.subtract(row, acc[i], out=scratch[i])
+                scratch *= alpha
+                acc += scratch
+            self.frames = k + 1
+
+    def mean(self, out: Optional[np.ndarray] = None) -> Optional[Tuple[np.ndarray, ...]]:
+        """
+        Copy of the current mean, one array per channel, or None before the first frame.
+        With `out`, a float32 array of (channels, samples), the mean is written into it
+        instead of a new array.
+        """
+        with self._lock:
+            if self._acc is None:
+                return None
+            if out is None:
+                out = np.empty_like(self._acc)
+            elif out.shape != self._acc.shape:
+                raise ValueError(f"out has shape {out.shape}, the mean has {self._acc.shape}")
+            if self._history is not None:
+                np.divide(self._acc, min(self.frames, self.count), out=out)
+            else:
+                np.copyto(out, self._acc)
+            return tuple(out)
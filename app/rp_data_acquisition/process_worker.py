@@ -0,0 +1,297 @@
+"""
+Acquisition in a separate process, exchanging frames through shared memory.
+
+The acquisition process runs an AcquisitionWorker on its own connection to the board
+and writes the frames into a SharedFrameRing; the display process reads the newest
+frame from it without copying, so Bokeh serialization and the Qt GUI do not share the
+GIL with the acquisition loop.
+
+    worker = ProcessAcquisitionWorker('rp-xxxxxx.local', decimation=64, data_units='Raw')
+    worker.start()
+    frame = worker.latest()
+    worker.session.update(trigger_level=0.2)
+    worker.stop()
+"""
+
+import json
+import multiprocessing as mp
+import queue
+import threading
+from multiprocessing import shared_memory
+from typing import Callable, Optional
+
+import numpy as np
+
+from app.rp_data_acquisition.scpi_data import ScpiData, BUFFER_SIZE
+from app.rp_data_acquisition.acquisition_session import AcquisitionSession
+from app.rp_data_acquisition.acquisition_worker import AcquisitionWorker, Frame
+from app.rp_data_acquisition.frame_averager import FrameAverager
+
+
+class SharedFrameRing:
+    """
+    Ring of frames in a multiprocessing.shared_memory block, written by one process and
+    read by others. Same put()/latest() as FrameRing.
+
+    Each slot has a sequence counter set to -1 while it is written (a sequence lock), so
+    readers never return a slot being written. latest() returns views into the block:
+    they stay valid until the writer comes back to that slot, `slots` - 1 frames later,
+    which is_current() tells.
+    """
+    SETTINGS_SIZE = 1024        # Bytes of JSON settings per slot
+
+    def __init__(self, name: Optional[str] = None, slots=8, channels=2, samples=BUFFER_SIZE):
+        """Create a ring, or attach to the ring of another process with `name`."""
+        if name is None:
+            shape = (slots, channels, samples)
+            self.shm = shared_memory.SharedMemory(create=True, size=self._size(shape))
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            shape = tuple(int(v) for v in np.ndarray((3,), np.int64, self.shm.buf, 0))
+            self.owner = False
+        self.name = self.shm.name
+        self._views(shape)
+
+        if self.owner:
+            self._shape[:] = shape
+            self._newest[0] = -1
+            self._rate[0] = 0.0
+            self._seqs[:] = -1
+        self.dropped = 0
+
+    @classmethod
+    def _size(cls, shape):
+        slots, channels, samples = shape
+        return 128 + slots * (8 * 5 + cls.SETTINGS_SIZE) + slots * channels * samples * 4
+
+    def _views(self, shape):
+        slots, channels, samples = shape
+        buf = self.shm.buf
+        self._shape = np.ndarray((3,), np.int64, buf, 0)
+        self._newest = np.ndarray((1,), np.int64, buf, 24)     # Sequence number of the newest complete frame
+        self._rate = np.ndarray((1,), np.float64, buf, 32)     # Acquisition rate of the writer
+        offset = 128
+        self._seqs = np.ndarray((slots,), np.int64, buf, offset)
+        offset += 8 * slots
+        self._lengths = np.ndarray((slots, 2), np.int64, buf, offset)   # Channels and samples in the slot
+        offset += 16 * slots
+        self._stamps = np.ndarray((slots,), np.float64, buf, offset)
+        offset += 8 * slots
+        self._settings_len = np.ndarray((slots,), np.int64, buf, offset)
+        offset += 8 * slots
+        self._settings = np.ndarray((slots, self.SETTINGS_SIZE), np.uint8, buf, offset)
+        offset += self.SETTINGS_SIZE * slots
+        self._data = np.ndarray(shape, np.float32, buf, offset)
+        self.slots = slots
+
+    @property
+    def rate(self) -> float:
+        return float(self._rate[0])
+
+    @rate.setter
+    def rate(self, value: float):
+        self._rate[0] = value
+
+    def put(self, frame: Frame):
+        settings = json.dumps(frame.settings).encode()
+        if len(settings) > self.SETTINGS_SIZE:
+            raise ValueError(f"Frame settings over {self.SETTINGS_SIZE} bytes")
+        channels, samples = len(frame.data), len(frame.data[0])
+        if channels > self._data.shape[1] or samples > self._data.shape[2]:
+            raise ValueError(f"Frame of {channels}x{samples} samples does not fit in the ring")
+
+        slot = frame.seq % self.slots
+        self._seqs[slot] = -1
+        for i, row in enumerate(frame.data):
+            self._data[slot, i, :samples] = row
+        self._lengths[slot] = channels, samples
+        self._stamps[slot] = frame.timestamp
+        self._settings[slot, :len(settings)] = np.frombuffer(settings, np.uint8)
+        self._settings_len[slot] = len(settings)
+        self._seqs[slot] = frame.seq
+        self._newest[0] = frame.seq
+
+    def latest(self) -> Optional[Frame]:
+        """Newest frame as views into the shared block, or None."""
+        seq = int(self._newest[0])
+        if seq < 0:
+            return None
+        slot = seq % self.slots
+        channels, samples = (int(v) for v in self._lengths[slot])
+        stamp = float(self._stamps[slot])
+        settings = self._settings[slot, :int(self._settings_len[slot])].tobytes()
+        if self._seqs[slot] != seq:
+            return None     # Overwritten while reading
+        data = tuple(self._data[slot, i, :samples] for i in range(channels))
+        return Frame(seq, stamp, data, json.loads(settings))
+
+    def is_current(self, frame: Frame) -> bool:
+        """False once the slot of `frame` was overwritten by a newer frame."""
+        return self._seqs[frame.seq % self.slots] == frame.seq
+
+    def close(self):
+        # Views into the block must go before it can be closed
+        self._shape = self._newest = self._rate = None
+        self._seqs = self._lengths = self._stamps = self._settings_len = self._settings = self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class SessionProxy:
+    """AcquisitionSession parameters in the display process, update() forwards changes to the acquisition process."""
+    window = staticmethod(AcquisitionSession.window)
+
+    def __init__(self, commands, params):
+        self.params = params
+        self._commands = commands
+
+    def update(self, **params):
+        for name in params:
+            if name not in self.params:
+                raise ValueError(f"Unknown acquisition parameter: {name}")
+        changed = {name: value for name, value in params.items() if self.params[name] != value}
+        if changed:
+            self.params.update(changed)
+            self._commands.put(("update", changed))
+
+
+def _acquisition_main(address, port, ring_name, commands, enabled, stop, params, channels, overlapped, raw_to_volts, idle_time, averaging):
+    """Entry point of the acquisition process."""
+    ring = SharedFrameRing(ring_name)
+    data = ScpiData(address, port=port, connect=False)
+    data.raw_to_volts = raw_to_volts
+    session = AcquisitionSession(data, channels=channels, overlapped=overlapped, **params)
+    averager = FrameAverager(**averaging)
+
+    connect = True
+    worker = AcquisitionWorker(session, enabled=lambda: enabled.is_set() and not connect, idle_time=idle_time, averager=averager, ring=ring)
+    worker.start()
+
+    try:
+        while not stop.is_set():
+            if connect:
+                try:
+                    data.connect()
+                    # scpi prints instead of raising when the connection fails
+                    if not data.is_rp_connected():
+                        raise ConnectionError(f"Red Pitaya {data.ip_address}:{data.port} not connected")
+                    connect = False
+                except Exception as e:
+                    print("Acquisition process, error connecting to Red Pitaya:", e)
+                    stop.wait(1.0)
+
+            try:
+                kind, arg = commands.get(timeout=idle_time)
+                if kind == "update":
+                    session.update(**arg)
+                elif kind == "averaging":
+                    averager.configure(**arg)
+                elif kind == "address":
+                    data.ip_address, data.port = arg
+                    connect = True
+            except queue.Empty:
+                pass
+            ring.rate = worker.acq_rate.rate
+    finally:
+        worker.stop(timeout=2.0)
+        data.close()
+        ring.close()
+
+
+class ProcessAcquisitionWorker:
+    """
+    AcquisitionWorker running in a separate process, with the same start(), stop(),
+    latest() and session.update() as the threaded one.
+
+    The process opens its own connection to the board at `address`. `enabled` is
+    evaluated in this process and forwarded every `idle_time` seconds. `params` are the
+    AcquisitionSession parameters.
+    """
+    def __init__(self, address, port=5000, channels=(1, 2), slots=8, enabled: Optional[Callable[[], bool]] = None, idle_time=0.05, overlapped=True, raw_to_volts=True, **params):
+        self.address = address
+        self.port = port
+        self.channels = tuple(channels)
+        self.slots = slots
+        self.enabled = enabled or (lambda: True)
+        self.idle_time = idle_time
+        self.overlapped = overlapped
+        self.raw_to_volts = raw_to_volts
+        self.averaging = dict(count=1, mode="linear")
+
+        # spawn: forking a process with the GUI and Bokeh threads running is not safe
+        self._ctx = mp.get_context("spawn")
+        self._commands = self._ctx.Queue()
+        self._enabled = self._ctx.Event()
+        self._stop = self._ctx.Event()
+        self._process = None
+        self._monitor: Optional[threading.Thread] = None
+
+        self.session = SessionProxy(self._commands, AcquisitionSession.default_params(**params))
+        self.ring: Optional[SharedFrameRing] = None
+
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.is_alive()
+
+    @property
+    def acq_rate(self) -> float:
+        return self.ring.rate if self.ring is not None else 0.0
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self.ring = SharedFrameRing(slots=self.slots, channels=len(self.channels))
+        self._process = self._ctx.Process(
+            target=_acquisition_main,
+            args=(self.address, self.port, self.ring.name, self._commands, self._enabled, self._stop,
+                  self.session.params, self.channels, self.overlapped, self.raw_to_volts, self.idle_time, self.averaging),
+            name="AcquisitionProcess",
+            daemon=True,
+        )
+        self._process.start()
+        self._monitor = threading.Thread(target=self._forward_enabled, name="AcquisitionProcessMonitor", daemon=True)
+        self._monitor.start()
+
+    def _forward_enabled(self):
+        while not self._stop.is_set():
+            if self.enabled():
+                self._enabled.set()
+            else:
+                self._enabled.clear()
+            self._stop.wait(self.idle_time)
+
+    def stop(self, timeout=None):
+        """Stop the acquisition process, waiting at most `timeout` seconds before terminating it."""
+        self._stop.set()
+        if self._process is not None:
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.terminate()
+                self._process.join()
+            self._process = None
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def latest(self) -> Optional[Frame]:
+        """Newest frame, its arrays are views into shared memory (see SharedFrameRing)."""
+        return self.ring.latest() if self.ring is not None else None
+
+    def configure_averaging(self, count=None, mode=None):
+        if count is not None:
+            self.averaging["count"] = count
+        if mode is not None:
+            self.averaging["mode"] = mode
+        self._commands.put(("averaging", dict(count=count, mode=mode)))
+
+    def set_address(self, address, port=None):
+        """Connect the acquisition process to another board."""
+        self.address = address
+        self.port = port or self.port
+        self._commands.put(("address", (self.address, self.port)))
@@ -1,17 +1,122 @@
 ﻿import numpy as np
 import app.redpitaya_scpi.redpitaya_scpi as scpi
+import threading
 import time
-import struct
+from typing import NamedTuple, Optional
+
+BUFFER_SIZE = 16384     # Samples per channel in the acquisition buffer
+ADC_RATE = 125e6        # Samples per second at decimation 1
+RAW_COUNTS = 8192       # RAW counts at full scale (14-bit signed samples)
+RAW_FULL_SCALE = {"LV": 1.0, "HV": 20.0}    # Volts at full scale per input gain
+
+
+class FetchWindow(NamedTuple):
+    """Part of the buffer to download, relative to the trigger."""
+    start: int                  # Buffer index of the first sample (the trigger is at BUFFER_SIZE // 2 - trigger_delay)
+    num_samples: int            # Argument of ACQ:SOUR<n>:DATA:TRig?
+    trig_pos: scpi.DataTriggerPosition
+
+    @property
+    def size(self) -> int:
+        """Samples returned per channel."""
+        if self.trig_pos == scpi.DataTriggerPosition.PRE_POST_TRIG:
+            return 2 * self.num_samples + 1
+        return self.num_samples
+
+
+def plan_fetch(x_range, decimation, trigger_delay=0, sampling_rate=ADC_RATE, margin=2, max_fraction=0.5) -> Optional[FetchWindow]:
+    """
+    Smallest window of the buffer covering the time range `x_range` (start, end) in µs,
+    with t = 0 at the center of the buffer as drawn by the plot.
+
+    The firmware only reads windows starting or centered at the trigger, so the window
+    also covers the samples between the trigger and the range.
+    Returns None when the whole buffer should be read: no range, a range outside of the
+    buffer, or a window larger than `max_fraction` of it, where a partial read saves little.
+    """
+    if x_range is None or None in x_range:
+        return None
+    x0, x1 = sorted(x_range)
+
+    fs = sampling_rate / decimation
+    half = BUFFER_SIZE // 2
+    i0 = max(int(np.floor(half + x0 * 1e-6 * fs)) - margin, 0)
+    i1 = min(int(np.ceil(half + x1 * 1e-6 * fs)) + margin, BUFFER_SIZE - 1)
+    if i1 < i0:
+        return None     # Range outside of the buffer
+
+    # The firmware locates the trigger, the window is given relative to it
+    trig = half - int(trigger_delay)
+    before, after = trig - i0, i1 - trig
+    if before <= 0:
+        window = FetchWindow(trig, after + 1, scpi.DataTriggerPosition.POST_TRIG)
+    elif after <= 0:
+        window = FetchWindow(i0, before + 1, scpi.DataTriggerPosition.PRE_TRIG)
+    else:
+        n = max(before, after)
+        if trig - n < 0 or trig + n >= BUFFER_SIZE:
+            return None
+        window = FetchWindow(trig - n, n, scpi.DataTriggerPosition.PRE_POST_TRIG)
+
+    if window.size > max_fraction * BUFFER_SIZE:
+        return None
+    return window
+
+
+class SegmentedCapture(NamedTuple):
+    """Result of ScpiData.capture_segments()."""
+    data: np.ndarray            # (segments, channels, samples)
+    timestamps: np.ndarray      # Host time.time() when each segment's buffer was full
+    trigger_waits: np.ndarray   # Seconds from arming to a full buffer, per segment
+
 
 class ScpiData:
-    def __init__(self, ip_address, port=5000):
+    def __init__(self, ip_address, port=5000, nodelay=True, rp=None, connect=True, connect_timeout=3.0):
         self.ip_address = ip_address
         self.port = port
-        self.rp = scpi.scpi(ip_address, port)
+        self.nodelay = nodelay
+        self.connect_timeout = connect_timeout
+        self.lock = threading.RLock()   # One thread at a time on the connection (e.g. UI and acquisition worker)
         self.decimation = int(2**3)
+        self._frame = None      # Receive array reused by read_data
+
+        self.trigger_delay = 0
+        self._armed_at = 0.0
+        self.last_trigger_wait = 0.0    # Seconds from arming to a full buffer in the last wait_fill()
+        self.last_wait_polls = 0        # Status queries sent in the last wait_fill()
+
+        # RAW transfers (int16, half the bytes of VOLTS) are scaled to volts on the host
+        self.raw_to_volts = False
+        self._raw_calibration = {}      # (channel, gain) -> (volts per count, offset in volts)
+
+        # rp: already opened scpi client, e.g. session_record.replay_scpi()
+        # With connect=False the connection is opened later with connect()
+        self.rp = rp
+        if rp is not None:
+            self._prepare_commands()
+        elif connect:
+            self.connect()
 
     def connect(self):
-        self.rp = scpi.scpi(self.ip_address, self.port)
+        # Name lookup (seconds for an mDNS name) and connection run without the lock,
+        # so the acquisition and UI calls are not blocked meanwhile
+        scpi.resolve_host(self.ip_address, self.port, timeout=self.connect_timeout)
+        rp = scpi.scpi(self.ip_address, port=self.port, nodelay=self.nodelay, connect_timeout=self.connect_timeout)
+
+        with self.lock:
+            # Close the previous connection instead of leaving it to the garbage collector
+            if self.rp is not None:
+                self.rp.close()
+            self.rp = rp
+            self._prepare_commands()
+
+    def _prepare_commands(self):
+        # Commands sent on every frame of read_data
+        self._acq_start = self.rp.prepare("ACQ:START")
+        self._acq_trig = self.rp.prepare("ACQ:TRIG %s")
+        self._acq_fill_q = self.rp.prepare("ACQ:TRIG:FILL?")
+        self._acq_trig_stat_q = self.rp.prepare("ACQ:TRIG:STAT?")
+        self._acq_stop = self.rp.prepare("ACQ:STOP")
 
     def generate_signal(self, channel=1, frequency=15000, amplitude=0.75, offset=0.0, waveform='sine'):
         """
@@ -44,21 +149,25 @@ class ScpiData:
 
         print(f"Generating {waveform} signal on channel {channel} with frequency {frequency} Hz, amplitude {amplitude} Vpp, and offset {offset} V.")
 
-        # Reset the channel and set the waveform parameters
-        self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
+        with self.lock, self.rp.batch():
+            # Reset the channel only while its state is unknown, afterwards only changes are sent
+            if not self.rp.has_state(f'SOUR{channel}:'):
+                self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
 
-        # Set the waveform type, frequency, amplitude, and offset
-        self.rp.tx_txt(f'SOUR{str(channel)}:FUNC {str(waveform.upper())}')
-        self.rp.tx_txt(f'SOUR{str(channel)}:FREQ:FIX {str(frequency)}')
-        self.rp.tx_txt(f'SOUR{str(channel)}:VOLT {str(amplitude)}')
-        self.rp.tx_txt(f'SOUR{str(channel)}:VOLT:OFFS {str(offset)}')
-        self.rp.tx_txt(f"SOUR{channel}:TRIG:INT")
+            # Set the waveform type, frequency, amplitude, and offset
+            changed = self.rp.tx_set(f'SOUR{channel}:FUNC', waveform.upper())
+            changed |= self.rp.tx_set(f'SOUR{channel}:FREQ:FIX', frequency)
+            changed |= self.rp.tx_set(f'SOUR{channel}:VOLT', amplitude)
+            changed |= self.rp.tx_set(f'SOUR{channel}:VOLT:OFFS', offset)
+            if changed:
+                self.rp.tx_txt(f"SOUR{channel}:TRIG:INT")
 
-        # Enable the output
-        self.rp.tx_txt(f'OUTPUT{str(channel)}:STATE ON')
+            # Enable the output
+            self.rp.tx_set(f'OUTPUT{channel}:STATE', 'ON')
 
     def trigger_generation(self):
-        self.rp.tx_txt(f'SOUR:TRIG:INT')
+        with self.lock:
+            self.rp.tx_txt(f'SOUR:TRIG:INT')
 
     def stop_signal(self, channel=1):
         """
@@ -66,10 +175,11 @@ class ScpiData:
         """
         if channel not in (1, 2):
             raise ValueError(f"Channel must be 1 or 2, got {channel}")
-        if not self.rp._socket:
+        if self.rp is None or not self.rp._socket:
             print("Not connected to Red Pitaya")
             return
-        self.rp.tx_txt(f'OUTPUT{channel}:STATE OFF')
+        with self.lock:
+            self.rp.tx_set(f'OUTPUT{channel}:STATE', 'OFF')
 
     def reset(self, channel=1):
         """
@@ -78,28 +188,39 @@ class ScpiData:
 
         if channel not in (1, 2):
             raise ValueError(f"Channel must be 1 or 2, got {channel}")
-        self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
+        with self.lock:
+            self.rp.tx_txt(f'SOUR{str(channel)}:FUNC:RESET')
 
     def configure_acquisition(self, decimation, trigger_level, data_units, data_format, trigger_source):
         self.decimation = decimation
-        self.rp.tx_txt(f"ACQ:DEC {str(decimation)}")
-        self.rp.tx_txt(f"ACQ:DATA:UNITS {str(data_units).upper()}")
-        self.rp.tx_txt(f"ACQ:DATA:FORMAT {str(data_format).upper()}")
-        self.rp.tx_txt(f"ACQ:TRig:LEV {str(trigger_level)}")
-        self.rp.tx_txt(f"ACQ:TRig {str(trigger_source)}")
+        with self.lock, self.rp.batch():
+            self.rp.tx_set("ACQ:DEC", decimation)
+            self.rp.tx_set("ACQ:DATA:UNITS", str(data_units).upper())
+            self.rp.tx_set("ACQ:DATA:FORMAT", str(data_format).upper())
+            self.rp.tx_set("ACQ:TRIG:LEV", trigger_level)
+            self.rp.tx_txt(f"ACQ:TRig {str(trigger_source)}")
 
     def stop_acquisition(self):
-        self.rp.tx_txt('ACQ:STOP')
+        with self.lock:
+            self.rp.tx_txt('ACQ:STOP')
 
     def is_rp_connected(self):
+        if self.rp is None:
+            return False
         try:
-            self.rp.tx_txt("*IDN?")
-            _ = self.rp.rx_txt()
+            with self.lock:
+                # Bounded wait, a board that went away must not block the caller
+                self.rp._socket.settimeout(self.connect_timeout) # type: ignore
+                try:
+                    self.rp.tx_txt("*IDN?")
+                    _ = self.rp.rx_txt()
+                finally:
+                    self.rp._socket.settimeout(self.rp.timeout) # type: ignore
             return True
         except Exception:
             return False
 
-    def read_data(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='bin', trigger_source='CH1_PE', timeout=5.0, center=0):
+    def read_data(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='bin', trigger_source='CH1_PE', timeout=5.0, center=0, channels=(1, 2)):
         """
         Read acquired data from Red Pitaya.
 
@@ -117,102 +238,307 @@ class ScpiData:
             seconds
         center : int
             trigger delay in samples (0–16384)
+        channels : tuple of int
+            channels to read, (1, 2, 3, 4) on STEMlab 125-14 4-Input
 
         Returns
         -------
-        y1, y2 : np.ndarray
-            acquired data from channels 1 and 2
+        y1, y2, ... : np.ndarray
+            acquired data, one array per channel (rows of a single array)
+        """
+        self.arm(decimation, trigger_level, data_units, data_format, trigger_source, center)
+        self.wait_fill(timeout)
+        data = self.fetch(channels)
+
+        try:
+            with self.lock:
+                self._acq_stop()
+        except:
+            pass
+
+        return data
+
+        # y1_post = y1[8192:]
+        # y2_post = y2[8192:]
+        # return y1_post, y2_post
+
+    def capture_segments(self, n_segments, decimation=8, trigger_level=0.1, data_units='Volts', data_format='bin', trigger_source='CH1_PE', timeout=5.0, center=0, channels=(1, 2), window: Optional[FetchWindow] = None, out=None, path=None, dtype=np.float32) -> SegmentedCapture:
         """
+        Capture `n_segments` consecutive triggers into one preallocated array.
+
+        The board is configured once; each segment is read with the next one armed in the
+        same write (see fetch()), so the dead time between segments is the download time.
+        Nothing is allocated per segment.
+
+        Parameters
+        ----------
+        n_segments : int
+            number of triggers to capture
+        decimation, trigger_level, data_units, data_format, trigger_source, timeout, center, channels :
+            as in ``read_data()``, `timeout` applies to each segment
+        window : FetchWindow, optional
+            part of the buffer to read from each segment, see plan_fetch()
+        out : np.ndarray, optional
+            (n_segments, channels, samples) array to fill
+        path : str, optional
+            when `out` is not given, the array is a memory-mapped .npy file at `path`
+            (readable later with np.load(path, mmap_mode='r'))
+        dtype :
+            dtype of the allocated array
+
+        Returns
+        -------
+        SegmentedCapture
+        """
+        shape = (n_segments, len(channels), window.size if window is not None else BUFFER_SIZE)
+        if out is None:
+            if path is not None:
+                out = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+            else:
+                out = np.empty(shape, dtype=dtype)
+        elif out.shape != shape:
+            raise ValueError(f"out has shape {out.shape}, expected {shape}")
+
+        timestamps = np.empty(n_segments)
+        trigger_waits = np.empty(n_segments)
+
+        self.arm(decimation, trigger_level, data_units, data_format, trigger_source, center)
+        try:
+            for i in range(n_segments):
+                self.wait_fill(timeout)
+                timestamps[i] = time.time()
+                trigger_waits[i] = self.last_trigger_wait
+
+                # The last segment does not arm another one
+                rearm_source = trigger_source if i < n_segments - 1 else None
+                self.fetch(channels, rearm_source=rearm_source, window=window, out=out[i])
+        finally:
+            try:
+                with self.lock:
+                    self._acq_stop()
+            except:
+                pass
+
+        if isinstance(out, np.memmap):
+            out.flush()
+        return SegmentedCapture(out, timestamps, trigger_waits)
+
+    def arm(self, decimation=8, trigger_level=0.1, data_units='Volts', data_format='bin', trigger_source='CH1_PE', center=0):
+        """
+        Configure the acquisition parameters that changed, start it and arm the trigger.
+        Steps of ``read_data()``, see it for the parameters.
+        """
+        if data_format.lower() not in ("ascii", "bin"):
+            raise ValueError(f"Formato desconocido: {data_format}")
 
         self.decimation = decimation
+        self.trigger_delay = int(center)
 
-        # 1. Reset first
-        self.rp.tx_txt("ACQ:RST")
+        # Steps 1-4 leave in a single write
+        with self.lock, self.rp.batch():
+            # 1. Reset first, only while the acquisition state is unknown
+            if not self.rp.has_state("ACQ:"):
+                self.rp.tx_txt("ACQ:RST")
 
-        # 2. Configure all acquisition parameters
-        self.rp.tx_txt(f"ACQ:DATA:FORMAT {data_format.upper()}")
-        self.rp.tx_txt(f"ACQ:DATA:UNITS {data_units.upper()}")
-        self.rp.tx_txt(f"ACQ:DEC {int(decimation)}")
-        self.rp.tx_txt(f"ACQ:TRIG:DLY {int(center)}")
-        self.rp.tx_txt(f"ACQ:TRIG:LEV {float(trigger_level)}")
+            # 2. Configure the acquisition parameters that changed
+            self.rp.tx_set("ACQ:DATA:FORMAT", data_format.upper())
+            self.rp.tx_set("ACQ:DATA:UNITS", data_units.upper())
+            self.rp.tx_set("ACQ:DEC", int(decimation))
+            self.rp.tx_set("ACQ:TRIG:DLY", int(center))
+            self.rp.tx_set("ACQ:TRIG:LEV", float(trigger_level))
 
-        # 3. Start acquisition
-        self.rp.tx_txt("ACQ:START")
-        
-        # 4. Arm trigger last
-        self.rp.tx_txt(f"ACQ:TRIG {trigger_source}")
+            # 3-4. Start acquisition and arm trigger last
+            self.rearm(trigger_source)
+
+    def rearm(self, trigger_source='CH1_PE'):
+        """
+        Start the acquisition and arm the trigger, keeping the configuration on the board.
+        """
+        with self.lock, self.rp.batch():
+            self._acq_start()
+            self._acq_trig(trigger_source.encode())
+        self._armed_at = time.perf_counter()
+
+    def fill_time(self, samples=BUFFER_SIZE):
+        """Seconds the board needs to acquire `samples` samples at the current decimation."""
+        return samples * self.decimation / ADC_RATE
+
+    def wait_fill(self, timeout=5.0, poll_min=1e-4, poll_max=20e-3, use_trig_stat=False):
+        """
+        Wait for a trigger and a full buffer, stopping the acquisition on timeout.
 
-        start_time = time.time()
+        Sleeps for the time the buffer needs to fill at the current decimation, then
+        polls with an interval doubling from `poll_min` up to `poll_max` seconds.
+        With `use_trig_stat`, ACQ:TRIG:STAT? is polled until the trigger is detected and
+        only the samples after the trigger are waited for before polling the fill state.
+        The wait is reported in `last_trigger_wait` and `last_wait_polls`.
+        """
+        start_time = time.perf_counter()
+        polls = 0
+
+        def _sleep_until(deadline):
+            delay = deadline - time.perf_counter()
+            if delay > 0:
+                time.sleep(min(delay, timeout))
+
+        def _poll(query, done):
+            nonlocal polls
+            interval = poll_min
+            while True:
+                polls += 1
+                with self.lock:
+                    reply = query.query()
+                if (reply or "").strip() == done:
+                    return
+                if time.perf_counter() - start_time > timeout:
+                    try:
+                        with self.lock:
+                            self._acq_stop()
+                    except:
+                        pass
+                    raise TimeoutError("Timeout esperando trigger y llenado de buffer")
+                time.sleep(interval)
+                interval = min(interval * 2, poll_max)
 
         # Esperar trigger válido y buffer lleno
-        while True:
-            # self.rp.tx_txt("ACQ:TRIG:STAT?")
-            # trig_stat = (self.rp.rx_txt() or "").strip()
-            self.rp.tx_txt("ACQ:TRIG:FILL?")
-            fill_stat = (self.rp.rx_txt() or "").strip()
-
-            # if trig_stat == "TD" and fill_stat == "1":  # Trigger Detected and Buffer Full
-            if fill_stat == "1":
-                break
-            if time.time() - start_time > timeout:
-                try:
-                    self.rp.tx_txt("ACQ:STOP")
-                except:
-                    pass
-                raise TimeoutError("Timeout esperando trigger y llenado de buffer")
-
-        def _read_channel_ascii(cmd):
-            self.rp.tx_txt(cmd)
-            raw = (self.rp.rx_txt() or "").strip()
-            if not raw:
-                raise ValueError(f"Respuesta vacía para {cmd}")
-            raw = raw.strip("{} \r\n")
-            parts = [p for p in raw.split(",") if p.strip() != ""]
-            if not parts:
-                raise ValueError(f"Sin datos numéricos en {cmd}: {raw!r}")
-            return np.array([float(s) for s in parts], dtype=float)
-
-        def _read_channel_bin(cmd):
-            self.rp.tx_txt(cmd)
-            raw = self.rp.rx_arb()
-            if not raw:
-                raise ValueError(f"Respuesta vacía para {cmd}")
-            # asegurar múltiplo de 4 bytes
-            n = (len(raw) // 4) * 4
-            buff = [
-                struct.unpack("!f", bytearray(raw[i:i+4]))[0]
-                for i in range(0, n, 4)
-            ]
-            if not buff:
-                raise ValueError(f"Sin datos numéricos en {cmd}: {raw!r}")
-            return np.array(buff, dtype=float)
-
-        if data_format.lower() == "ascii":
-            y1 = _read_channel_ascii("ACQ:SOUR1:DATA?")
-            y2 = _read_channel_ascii("ACQ:SOUR2:DATA?")
-        elif data_format.lower() == "bin":
-            y1 = _read_channel_bin("ACQ:SOUR1:DATA?")
-            y2 = _read_channel_bin("ACQ:SOUR2:DATA?")
+        if use_trig_stat:
+            # Samples before the trigger are acquired first, the trigger can't be detected earlier
+            _sleep_until(self._armed_at + self.fill_time(BUFFER_SIZE // 2 - self.trigger_delay))
+            _poll(self._acq_trig_stat_q, "TD")
+            _sleep_until(time.perf_counter() + self.fill_time(BUFFER_SIZE // 2 + self.trigger_delay))
         else:
-            raise ValueError(f"Formato desconocido: {data_format}")
+            _sleep_until(self._armed_at + self.fill_time())
+        _poll(self._acq_fill_q, "1")
 
-        try:
-            self.rp.tx_txt("ACQ:STOP")
-        except:
-            pass
+        self.last_trigger_wait = time.perf_counter() - self._armed_at
+        self.last_wait_polls = polls
 
-        return y1, y2
+    def fetch(self, channels=(1, 2), rearm_source=None, window: Optional[FetchWindow] = None, out=None):
+        """
+        Read the acquired buffer of `channels`, returns one float array per channel.
+        With `rearm_source`, the acquisition is restarted and the trigger armed in the same
+        write as the data queries, so the next frame fills while this one is downloaded.
+        With `window` (see plan_fetch()), only that part of the buffer is read.
+        With `out`, a (channels, samples) array, the data is converted into it in place.
+        """
+        query = {}
+        if window is not None:
+            query = dict(num_samples=window.num_samples, trig_pos=window.trig_pos)
+
+        then = None
+        if rearm_source is not None:
+            then = ["ACQ:START", f"ACQ:TRIG {rearm_source}"]
+
+        # All channels in one pipelined request, received into the rows of one array
+        with self.lock:
+            sent_at = time.perf_counter()
+            frame = self.rp.acq_data_multi(channels, input4=max(channels) > 2, out=self._frame, then=then, **query)
+            if then is not None:
+                self._armed_at = sent_at
+            self._frame = frame.data
+            if frame.data.size == 0:
+                raise ValueError(f"Sin datos numéricos en canales {channels}")
+
+            # One vectorized conversion from the wire dtype ('>f4' or '>i2')
+            if frame.units == "RAW" and self.raw_to_volts:
+                scale, offset = self._raw_scales(frame.channels)
+                if out is not None:
+                    np.multiply(frame.data, scale, out=out)
+                    np.add(out, offset, out=out)
+                    return tuple(out)
+                return tuple(frame.data * scale + offset)
+            if out is not None:
+                out[...] = frame.data
+                return tuple(out)
+            return tuple(frame.data.astype(float))
+
+    def set_gain(self, channel, gain):
+        """Set the input gain 'LV' (±1 V) or 'HV' (±20 V) of a channel."""
+        gain = gain.upper()
+        if gain not in RAW_FULL_SCALE:
+            raise ValueError(f"gain must be one of {set(RAW_FULL_SCALE)}")
+        with self.lock:
+            self.rp.tx_set(f"ACQ:SOUR{channel}:GAIN", gain)
+
+    def set_raw_calibration(self, channel, gain, scale, offset=0.0):
+        """
+        Replace the nominal RAW to volts conversion of a channel and gain
+        (full scale / 8192 volts per count) with a calibrated one.
+        """
+        self._raw_calibration[(channel, gain.upper())] = (float(scale), float(offset))
 
-        # y1_post = y1[8192:]
-        # y2_post = y2[8192:]
-        # return y1_post, y2_post
+    def needs_raw_calibration(self, channels=(1, 2)):
+        """True if any of `channels` has no RAW to volts calibration at its current gain."""
+        with self.lock:
+            gains = self.rp.query_cached_many([f"ACQ:SOUR{ch}:GAIN" for ch in channels])
+        return any((ch, gain.strip().upper()) not in self._raw_calibration for ch, gain in zip(channels, gains))
+
+    def calibrate_raw(self, channels=(1, 2), timeout=1.0):
+        """
+        Derive the RAW to volts conversion of `channels` at their current gain from one
+        buffer read in both units, so RAW transfers show the volts of the firmware's VOLTS
+        (which applies the board calibration).
+
+        Acquires at decimation 1 with the 'NOW' trigger and leaves the board in VOLTS,
+        configure the acquisition again afterwards.
+        """
+        channels = tuple(channels)
+        input4 = max(channels) > 2
+
+        # wait_fill() times the fill with `decimation`, the caller's value is kept for its next frames
+        decimation = self.decimation
+        self.decimation = 1
+        try:
+            with self.lock, self.rp.batch():
+                self.rp.tx_set("ACQ:DATA:FORMAT", "BIN")
+                self.rp.tx_set("ACQ:DATA:UNITS", "RAW")
+                self.rp.tx_set("ACQ:DEC", 1)
+                self.rearm("NOW")
+            self.wait_fill(timeout)
+
+            # The stopped buffer is read twice, converted by the firmware the second time
+            with self.lock:
+                self._acq_stop()
+                raw = self.rp.acq_data_multi(channels, input4=input4).data.astype(float)
+                self.rp.tx_set("ACQ:DATA:UNITS", "VOLTS")
+                volts = self.rp.acq_data_multi(channels, input4=input4).data.astype(float)
+                gains = self.rp.query_cached_many([f"ACQ:SOUR{ch}:GAIN" for ch in channels])
+        finally:
+            self.decimation = decimation
+
+        for ch, gain, r, v in zip(channels, gains, raw, volts):
+            gain = gain.strip().upper()
+            if np.ptp(r) > 0:
+                scale, offset = np.polyfit(r, v, 1)
+            else:
+                # A constant input only gives the offset
+                scale = RAW_FULL_SCALE.get(gain, 1.0) / RAW_COUNTS
+                offset = np.mean(v - scale * r)
+            self.set_raw_calibration(ch, gain, scale, offset)
+
+    def _raw_scales(self, channels):
+        """Return (scale, offset) column arrays converting RAW counts of `channels` to volts."""
+        # Gains come from the shadow state, the unknown ones are queried in one round trip
+        gains = self.rp.query_cached_many([f"ACQ:SOUR{ch}:GAIN" for ch in channels])
+
+        scale = np.empty((len(channels), 1))
+        offset = np.empty((len(channels), 1))
+        for i, (ch, gain) in enumerate(zip(channels, gains)):
+            gain = gain.strip().upper()
+            # Nominal conversion until the channel is calibrated
+            nominal = (RAW_FULL_SCALE.get(gain, 1.0) / RAW_COUNTS, 0.0)
+            scale[i], offset[i] = self._raw_calibration.get((ch, gain), nominal)
+        return scale, offset
 
     def acq_setDecimation(self, value: int):
-        self.rp.tx_txt(f"ACQ:DEC {value}")
+        with self.lock:
+            self.rp.tx_set("ACQ:DEC", value)
 
     def acq_getDecimation(self) -> str:
-        self.rp.tx_txt("ACQ:DEC?")
-        return self.rp.rx_txt() or ""
+        with self.lock:
+            return self.rp.query_cached("ACQ:DEC") or ""
 
     def close(self):
-        self.rp.close()
+        with self.lock:
+            if self.rp is not None:
+                self.rp.close()
@@ -1,4 +1,5 @@
 ﻿import time
+import threading
 import pandas as pd
 import numpy as np
 
@@ -8,11 +9,15 @@ from bokeh.models import ColumnDataSource
 from bokeh.plotting import figure as bk_figure
 from bokeh.models import Range1d, DataRange1d
 
-from app.rp_data_acquisition.scpi_data import ScpiData
+from app.rp_data_acquisition.scpi_data import ScpiData, BUFFER_SIZE
+from app.rp_data_acquisition.acquisition_session import AcquisitionSession
+from app.rp_data_acquisition.acquisition_worker import AcquisitionWorker, RateMeter
+from app.rp_data_acquisition.frame_averager import FrameAverager
+from app.rp_data_acquisition.process_worker import ProcessAcquisitionWorker
 from app.rp_data_acquisition.serial_data import SerialData
 
 class BokehPlot:
-    def __init__(self, plot_b, n_plots=2, baud_rate=115200 ,roll_over=5000, colors=['red', 'blue', 'green', 'yellow', 'orange', 'purple'], update_time=10, scatter_plot=False, oscilloscope_mode=False, sampling_rate=125e6, rp=None, rp_ip='rp-f0c5e4.local'):
+    def __init__(self, plot_b, n_plots=2, baud_rate=115200 ,roll_over=5000, colors=['red', 'blue', 'green', 'yellow', 'orange', 'purple'], update_time=10, scatter_plot=False, oscilloscope_mode=False, sampling_rate=125e6, rp=None, rp_ip='rp-f0c5e4.local', acquisition_process=False):
         self.n_plots = n_plots
         self.plot_b = plot_b
         self.roll_over = roll_over
@@ -32,7 +37,11 @@ class BokehPlot:
         self.trigger_source = "CH1_PE"  # CH1_PE, CH2_PE, EXT_PE, DISABLED
         self.trigger_delay = 0  # en muestras, -8192 a 8192
         self.rp_ip = rp_ip
+        self.acquisition_process = acquisition_process    # Acquire in a separate process (ProcessAcquisitionWorker)
         self.rp_connected = False
+        self.rp_connecting = False
+        self._connect_id = 0        # Only the latest connection attempt updates the state
+        self._connect_lock = threading.Lock()
 
         self.periodic_callback = None
         
@@ -45,11 +54,9 @@ class BokehPlot:
             self.plot_b.x_range = DataRange1d()
 
         if rp is None:
-            try: 
-                self.rp = ScpiData(self.rp_ip)
-                self.rp_connected = self.rp.is_rp_connected()
-            except Exception as e:
-                print("Error initializing ScpiData:", e)    
+            # Connect in the background, the UI must not wait for the board
+            self.rp = ScpiData(self.rp_ip, connect=False)
+            self.connect_rp()
         else:
             try:
                 self.rp = rp
@@ -57,6 +64,31 @@ class BokehPlot:
             except Exception as e:
                 print("Error setting Red Pitaya instance:", e)
 
+        # Configured once, then only re-armed; update_* send the parameters that changed
+        # RAW int16 samples are half the bytes of VOLTS and are scaled to volts here
+        # Overlapped: the next frame is armed with the data queries and fills during the download
+        acquisition = dict(
+            decimation=self.decimation,
+            trigger_level=self.trigger_level,
+            trigger_delay=self.trigger_delay,
+            trigger_source=self.trigger_source,
+            data_units="Raw",
+            overlapped=True,
+        )
+        enabled = lambda: self.osci and self.reading and self.rp_connected
+
+        # Frames are acquired on a background thread, or process, the periodic callback only draws the newest one
+        # All of them are averaged there too, a count of 1 shows single shots
+        if self.acquisition_process:
+            self.worker = ProcessAcquisitionWorker(self.rp_ip, port=self.rp.port, enabled=enabled, **acquisition)
+            self.session = self.worker.session
+        else:
+            self.rp.raw_to_volts = True
+            self.session = AcquisitionSession(self.rp, **acquisition)
+            self.worker = AcquisitionWorker(self.session, enabled=enabled, averager=FrameAverager())
+        self.display_rate = RateMeter()
+        self._last_frame_seq = -1
+
     def setup_plot(self):
         for i in range(self.n_plots):
             source = ColumnDataSource(data=dict(x=[], y=[]))
@@ -75,6 +107,7 @@ class BokehPlot:
         self.doc = doc
         doc.theme = "dark_minimal"
         doc.add_root(self.plot_b)
+        self.worker.start()
         
         if self.osci:
             self.periodic_callback = doc.add_periodic_callback(self.update_oscilloscope_scpi, self.update_time)
@@ -83,34 +116,35 @@ class BokehPlot:
     
     def update_oscilloscope_scpi(self):
 
-        if self.reading:
-            try:
-                y1, y2 = self.rp.read_data(decimation=self.decimation, trigger_level=self.trigger_level, trigger_source=self.trigger_source, center=self.trigger_delay)  # type: ignore
-            except Exception as e:
-                print("SCPI read_data error:", e)
-                return
+        if self.reading and self.rp_connected:
+            # Only the samples inside the visible x range are downloaded
+            self.session.update(x_range=(self.plot_b.x_range.start, self.plot_b.x_range.end))
+
+            frame = self.worker.latest()
+            if frame is None or frame.seq == self._last_frame_seq:
+                return  # Sin frame nuevo
+            self._last_frame_seq = frame.seq
+            y1, y2 = frame.data
 
             if len(y1) == 0 or len(y2) == 0:
                 print("SCPI returned empty arrays")
                 return
 
-            fs = float(self.sampling_rate) / self.decimation  # frecuencia de muestreo
-            n = min(len(y1), len(y2))  # nos aseguramos de que ambos tienen al menos n datos
-
-            # Si es impar, descartamos 1 para que sea par
-            if n % 2 != 0:
-                n -= 1
-                y1 = y1[:n]
-                y2 = y2[:n]
+            fs = float(self.sampling_rate) / frame.settings["decimation"]  # frecuencia de muestreo
 
-            half = n // 2
+            # Ventana del buffer leída con los parámetros del frame
+            window = self.session.window(frame.settings)
+            if window is not None and len(y1) != window.size:
+                return
+            start = window.start if window is not None else 0
 
-            # Cortamos al centro por seguridad
-            y1 = y1[:n]
-            y2 = y2[:n]
+            n = min(len(y1), len(y2))  # nos aseguramos de que ambos tienen al menos n datos
+            # Los arrays del frame son buffers que el worker reutiliza y Bokeh los serializa después
+            y1 = y1[:n].copy()
+            y2 = y2[:n].copy()
 
-            # eje de tiempo centrado en cero, en microsegundos
-            t = (np.arange(-half, half) / fs) * 1e6
+            # eje de tiempo en microsegundos, cero en el centro del buffer
+            t = ((start + np.arange(n) - BUFFER_SIZE // 2) / fs) * 1e6
 
         else:
             return
@@ -118,6 +152,7 @@ class BokehPlot:
         try:
             self.sources[0].stream(dict(x=t, y=y1), rollover=n)
             self.sources[1].stream(dict(x=t, y=y2), rollover=n)
+            self.display_rate.tick()
         except Exception as e:
             print("Bokeh stream error:", e)
 
@@ -233,6 +268,7 @@ class BokehPlot:
             elif decim > 16:
                 decim = 16
             self.decimation = int(2**decim)
+            self.session.update(decimation=self.decimation)
 
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
@@ -247,6 +283,7 @@ class BokehPlot:
             elif trigger_level > 10.0:
                 trigger_level = 10.0
             self.trigger_level = float(trigger_level)
+            self.session.update(trigger_level=self.trigger_level)
 
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
@@ -261,6 +298,19 @@ class BokehPlot:
             elif center > 8192:
                 center = 8192
             self.trigger_delay = int(center)
+            self.session.update(trigger_delay=self.trigger_delay)
+
+        if hasattr(self, "doc"):
+            self.doc.add_next_tick_callback(_update)
+        else:
+            print("Document not attached yet.")
+
+    def update_averaging(self, count: int = 1, mode: str = "linear"):
+        def _update():
+            nonlocal count
+            if count < 1:
+                count = 1
+            self.worker.configure_averaging(count=count, mode=mode)
 
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
@@ -271,6 +321,7 @@ class BokehPlot:
         def _update():
             nonlocal trigger_source
             self.trigger_source = trigger_source
+            self.session.update(trigger_source=self.trigger_source)
 
         if hasattr(self, "doc"):
             self.doc.add_next_tick_callback(_update)
@@ -309,6 +360,9 @@ class BokehPlot:
 
         # Generación real de señal
         if self.osci:
+            if not self.rp_connected:
+                print("Red Pitaya not connected")
+                return
             self.rp.generate_signal(channel=ch, amplitude=vpp/2, frequency=fq, waveform=wf) #type: ignore
         else:
             bash_cmd = f'generate {ch} {vpp} {fq} {wf}'
@@ -335,26 +389,44 @@ class BokehPlot:
                 lambda i=i, new_data=new_data: self.sources[i].stream(new_data, rollover=None)
             )
     
-    def update_rp_ip(self, new_ip: str):
-        def _update():
-            self.rp_connected = False
-            self.rp_ip = new_ip
-            self.rp.ip_address = new_ip
-
-            try:
-                self.rp.connect()
-                self.rp_connected = self.rp.is_rp_connected()
-            except Exception as e:
-                print("Error updating Red Pitaya IP:", e)
-                self.rp_connected = self.rp.is_rp_connected()
-                return
+    def connect_rp(self):
+        """Open the connection to `rp_ip` on a background thread.
+        `rp_connecting` is True while the attempt is running."""
+        self._connect_id += 1
+        connect_id = self._connect_id
+        self.rp_connected = False
+        self.rp_connecting = True
+
+        def _connect():
+            with self._connect_lock:
+                # A newer attempt was started while this one was waiting
+                if connect_id != self._connect_id:
+                    return
+                try:
+                    self.rp.connect()
+                    connected = self.rp.is_rp_connected()
+                except Exception as e:
+                    print("Error connecting to Red Pitaya:", e)
+                    connected = False
+
+                if connect_id == self._connect_id:
+                    self.rp_connected = connected
+                    self.rp_connecting = False
+                    if connected:
+                        print(f"Connected to Red Pitaya at: {self.rp_ip}")
+
+        threading.Thread(target=_connect, daemon=True).start()
 
-            print(f"Updated Red Pitaya IP to: {self.rp_ip}")
+    def update_rp_ip(self, new_ip: str):
+        new_ip = new_ip.strip()
+        if not new_ip or (new_ip == self.rp_ip and (self.rp_connected or self.rp_connecting)):
+            return
 
-        if hasattr(self, "doc"):
-            self.doc.add_next_tick_callback(_update)
-        else:
-            print("Document not attached yet.")
+        self.rp_ip = new_ip
+        self.rp.ip_address = new_ip
+        self.connect_rp()
+        if self.acquisition_process:
+            self.worker.set_address(new_ip)
     
     def auto_scale(self):
         def _update():
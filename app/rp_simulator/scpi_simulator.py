@@ -0,0 +1,588 @@
+"""
+Local Red Pitaya SCPI server for benchmarking and tests without hardware.
+
+Speaks the subset of SCPI used by the app (`*IDN?`, `ACQ:*`, `SOUR<n>:*`,
+`OUTPUT<n>:STATE`, `DIG:PIN`, `ANALOG:PIN`), synthesizes the acquired
+waveforms from the generator state (outputs looped back to the inputs) and
+models the link with a configurable latency and bandwidth.
+
+Run it from the repository root with:
+
+    python -m app.rp_simulator.scpi_simulator --port 5000 --latency-ms 0.5 --bandwidth-mbps 100
+"""
+
+import argparse
+import re
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+BUFFER_SIZE = 16384
+ADC_RATE = 125e6
+RAW_FULL_SCALE = {"LV": 1.0, "HV": 20.0}    # Volts at +-8192 RAW counts
+
+
+class SimulatedBoard(object):
+    """State of the simulated Red Pitaya, shared by every connection to the server."""
+
+    def __init__(self, noise: float = 0.0, seed: Optional[int] = None):
+        self.noise = noise
+        self.lock = threading.RLock()
+        self.rng = np.random.default_rng(seed)
+
+        self.errors: List[Tuple[int, str]] = []
+        self.digital: Dict[str, int] = {}
+        self.digital_dir: Dict[str, str] = {}
+        self.analog_out = [0.0] * 4
+        self.analog_in = [0.0] * 4
+
+        self.gen = {ch: self._gen_defaults() for ch in (1, 2)}
+        self.acq_reset()
+
+    ### GENERATOR ###
+
+    @staticmethod
+    def _gen_defaults() -> dict:
+        return {"func": "SINE", "freq": 1000.0, "volt": 1.0, "offs": 0.0, "phas": 0.0, "dcyc": 0.5, "output": False}
+
+    def waveform(self, chan: int, t: np.ndarray) -> np.ndarray:
+        """Generator output of channel `chan` at times `t` (seconds)."""
+        if chan not in self.gen or not self.gen[chan]["output"]:
+            return np.zeros_like(t)
+
+        g = self.gen[chan]
+        x = (g["freq"] * t + g["phas"] / 360.0) % 1.0     # Phase in cycles [0, 1)
+        func = g["func"]
+
+        if func == "SINE":
+            y = np.sin(2 * np.pi * x)
+        elif func == "SQUARE":
+            y = np.where(x < 0.5, 1.0, -1.0)
+        elif func == "TRIANGLE":
+            y = 1.0 - 4.0 * np.abs(x - 0.5)
+        elif func == "SAWU":
+            y = 2.0 * x - 1.0
+        elif func == "SAWD":
+            y = 1.0 - 2.0 * x
+        elif func == "PWM":
+            y = np.where(x < g["dcyc"], 1.0, -1.0)
+        elif func == "DC":
+            y = np.ones_like(t)
+        elif func == "DC_NEG":
+            y = -np.ones_like(t)
+        else:
+            y = np.zeros_like(t)
+
+        return g["volt"] * y + g["offs"]
+
+    ### ACQUISITION ###
+
+    def acq_reset(self):
+        self.dec = 1
+        self.avg = "ON"
+        self.units = "VOLTS"
+        self.data_format = "ASCII"
+        self.trig_lev = 0.0
+        self.trig_dly = 0
+        self.trig_hyst = 0.005
+        self.gain = {ch: "LV" for ch in (1, 2, 3, 4)}
+        self.trig_source = "DISABLED"
+        self.running = False
+        self.armed_at: Optional[float] = None
+        self.trig_time: Optional[float] = None
+        self.data: Optional[np.ndarray] = None
+
+    def acq_arm(self, source: str):
+        self.trig_source = source
+        self.armed_at = time.monotonic()
+        self.trig_time = None
+        self.data = None
+
+    def _trigger_offset(self) -> Optional[float]:
+        """Generator time of the trigger event or None if the source never triggers."""
+        source = self.trig_source
+        if source in ("NOW", "AWG_PE", "AWG_NE"):
+            return float(self.rng.uniform(0, 1))
+
+        m = re.fullmatch(r"CH([1-4])_(PE|NE)", source)
+        if m is None:
+            return None     # DISABLED or EXT_*: no signal on the external trigger input
+
+        chan = int(m.group(1))
+        # Search one period of the signal for a crossing of the trigger level
+        freq = self.gen[chan]["freq"] if chan in self.gen and self.gen[chan]["output"] else 0.0
+        if freq <= 0:
+            return None
+        t = np.linspace(0, 1.0 / freq, 4097)
+        y = self.waveform(chan, t)
+        if m.group(2) == "PE":
+            idx = np.nonzero((y[:-1] < self.trig_lev) & (y[1:] >= self.trig_lev))[0]
+        else:
+            idx = np.nonzero((y[:-1] > self.trig_lev) & (y[1:] <= self.trig_lev))[0]
+        if len(idx) == 0:
+            return None
+        return float(t[idx[0] + 1])
+
+    def fill_time(self) -> float:
+        return BUFFER_SIZE * self.dec / ADC_RATE
+
+    def acq_update(self):
+        """Trigger and fill the buffer once enough wall time has passed since arming."""
+        if not self.running or self.armed_at is None or self.data is not None:
+            return
+
+        # The pre-trigger part of the buffer has to fill before a trigger is accepted
+        now = time.monotonic()
+        pre_trigger = (BUFFER_SIZE // 2 - self.trig_dly) * self.dec / ADC_RATE
+        if self.trig_time is None:
+            if now - self.armed_at < max(pre_trigger, 0.0):
+                return
+            t0 = self._trigger_offset()
+            if t0 is None:
+                return
+            # Periodic signals cross the level within one period, so the trigger is
+            # taken as soon as the pre-trigger samples are in the buffer
+            self.trig_time = self.armed_at + max(pre_trigger, 0.0)
+            self._trig_t0 = t0
+
+        if now - self.trig_time < self.fill_time() - max(pre_trigger, 0.0):
+            return
+
+        # Trigger sample sits in the middle of the buffer, moved by the trigger delay
+        dt = self.dec / ADC_RATE
+        trig_idx = BUFFER_SIZE // 2 - self.trig_dly
+        t = self._trig_t0 + (np.arange(BUFFER_SIZE) - trig_idx) * dt
+
+        data = np.zeros((4, BUFFER_SIZE))
+        for ch in (1, 2):
+            data[ch - 1] = self.waveform(ch, t)
+        if self.noise:
+            data += self.rng.normal(0, self.noise, data.shape)
+
+        self.data = data
+        self.running = False
+
+    def fill_state(self) -> str:
+        self.acq_update()
+        return "1" if self.data is not None else "0"
+
+    def trig_state(self) -> str:
+        self.acq_update()
+        return "TD" if self.trig_time is not None or not self.running else "WAIT"
+
+    def channel_data(self, chan: int) -> np.ndarray:
+        self.acq_update()
+        if self.data is None:
+            return np.zeros(BUFFER_SIZE)
+        return self.data[chan - 1]
+
+    def trigger_position(self) -> int:
+        return BUFFER_SIZE // 2 - self.trig_dly
+
+    def encode(self, chan: int, values: np.ndarray) -> bytes:
+        """Encode acquired samples in the current units and format."""
+        if self.units == "RAW":
+            fs = RAW_FULL_SCALE[self.gain[chan]]
+            values = np.clip(np.round(values / fs * 8192), -8192, 8191).astype(np.int16)
+
+        if self.data_format == "BIN":
+            payload = values.astype('>i2' if self.units == "RAW" else '>f4').tobytes()
+            size = str(len(payload)).encode()
+            return b'#' + str(len(size)).encode() + size + payload
+
+        if self.units == "RAW":
+            return ("{" + ",".join(str(int(v)) for v in values) + "}").encode()
+        return ("{" + ",".join(f"{v:.6f}" for v in values) + "}").encode()
+
+    ### ERRORS ###
+
+    def push_error(self, code: int, msg: str):
+        self.errors.append((code, msg))
+
+    def status_byte(self) -> int:
+        return 0x4 if self.errors else 0
+
+
+class _ScpiHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection: one SCPI command per `\\r\\n` terminated line."""
+
+    def setup(self):
+        super().setup()
+        # Like the board's server: a short reply after a data block must not wait for the delayed ACK
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.board: SimulatedBoard = self.server.board # type: ignore
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                break
+            cmd = line.decode('utf-8', errors='replace').strip()
+            if not cmd:
+                continue
+            with self.board.lock:
+                reply = self.server.dispatch(self.board, cmd) # type: ignore
+            if reply is not None:
+                self.server.link_send(self.wfile, reply + b'\r\n') # type: ignore
+
+
+class ScpiSimulator(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server simulating a Red Pitaya SCPI server.
+
+    Args:
+        host (str, optional): Address to bind. Defaults to "127.0.0.1".
+        port (int, optional): Port to bind, 0 picks a free port. Defaults to 5000.
+        latency (float, optional): One-way link latency in seconds added to every reply. Defaults to 0.
+        bandwidth (float, optional): Link bandwidth in bytes per second, None for unlimited. Defaults to None.
+        noise (float, optional): Standard deviation of the noise added to acquired samples in Volts. Defaults to 0.
+        seed (int, optional): Seed of the noise and trigger phase generator. Defaults to None.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 5000, latency: float = 0.0, bandwidth: Optional[float] = None, noise: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.board = SimulatedBoard(noise=noise, seed=seed)
+        self._thread: Optional[threading.Thread] = None
+        super().__init__((host, port), _ScpiHandler)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server_address # type: ignore
+
+    def start(self) -> "ScpiSimulator":
+        """Serve from a background daemon thread."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and close the listening socket."""
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def link_send(self, wfile, data: bytes):
+        """Send a reply through the modelled link."""
+        delay = self.latency
+        if self.bandwidth:
+            delay += len(data) / self.bandwidth
+        if delay > 0:
+            time.sleep(delay)
+        wfile.write(data)
+        wfile.flush()
+
+    ### COMMANDS ###
+
+    def dispatch(self, board: SimulatedBoard, cmd: str) -> Optional[bytes]:
+        """Execute one command and return the reply (queries only)."""
+        header, _, args = cmd.partition(' ')
+        header = header.upper()
+        args = args.strip()
+
+        for pattern, handler in self._COMMANDS:
+            m = pattern.fullmatch(header)
+            if m is not None:
+                try:
+                    reply = handler(self, board, args, *m.groups())
+                except (ValueError, IndexError, KeyError):
+                    board.push_error(-224, f"Illegal parameter value: {cmd}")
+                    return b'ERR!' if header.endswith('?') else None
+                if reply is None:
+                    return None
+                return reply if isinstance(reply, bytes) else str(reply).encode()
+
+        board.push_error(-113, f"Undefined header: {cmd}")
+        return b'ERR!' if header.endswith('?') else None
+
+    # IEEE and system
+    def _idn(self, b, args):
+        return "REDPITAYA,INSTR2014,0,01-02 (simulator)"
+
+    def _rst(self, b, args):
+        b.acq_reset()
+        b.gen = {ch: b._gen_defaults() for ch in (1, 2)}
+
+    def _cls(self, b, args):
+        b.errors.clear()
+
+    def _stb(self, b, args):
+        return b.status_byte()
+
+    def _err_next(self, b, args):
+        if not b.errors:
+            return '0,"No error"'
+        code, msg = b.errors.pop(0)
+        return f'{code},"{msg}"'
+
+    def _err_count(self, b, args):
+        return len(b.errors)
+
+    # Acquisition
+    def _acq_rst(self, b, args):
+        b.acq_reset()
+
+    def _acq_start(self, b, args):
+        b.running = True
+        b.armed_at = None
+        b.trig_time = None
+        b.data = None
+
+    def _acq_stop(self, b, args):
+        b.running = False
+
+    def _acq_dec(self, b, args):
+        b.dec = int(args)
+
+    def _acq_dec_q(self, b, args):
+        return b.dec
+
+    def _acq_avg(self, b, args):
+        b.avg = args.upper()
+
+    def _acq_avg_q(self, b, args):
+        return b.avg
+
+    def _acq_units(self, b, args):
+        if args.upper() not in ("VOLTS", "RAW"):
+            raise ValueError(args)
+        b.units = args.upper()
+
+    def _acq_units_q(self, b, args):
+        return b.units
+
+    def _acq_format(self, b, args):
+        if args.upper() not in ("BIN", "ASCII"):
+            raise ValueError(args)
+        b.data_format = args.upper()
+
+    def _acq_format_q(self, b, args):
+        return b.data_format
+
+    def _acq_trig(self, b, args):
+        b.acq_arm(args.upper())
+
+    def _acq_trig_lev(self, b, args):
+        b.trig_lev = float(args)
+
+    def _acq_trig_lev_q(self, b, args):
+        return b.trig_lev
+
+    def _acq_trig_dly(self, b, args):
+        b.trig_dly = int(args)
+
+    def _acq_trig_dly_q(self, b, args):
+        return b.trig_dly
+
+    def _acq_trig_hyst(self, b, args):
+        b.trig_hyst = float(args)
+
+    def _acq_trig_hyst_q(self, b, args):
+        return b.trig_hyst
+
+    def _acq_trig_fill_q(self, b, args):
+        return b.fill_state()
+
+    def _acq_trig_stat_q(self, b, args):
+        return b.trig_state()
+
+    def _acq_tpos_q(self, b, args):
+        return b.trigger_position()
+
+    def _acq_buf_size_q(self, b, args):
+        return BUFFER_SIZE
+
+    def _acq_gain(self, b, args, ch):
+        if args.upper() not in RAW_FULL_SCALE:
+            raise ValueError(args)
+        b.gain[int(ch)] = args.upper()
+
+    def _acq_gain_q(self, b, args, ch):
+        return b.gain[int(ch)]
+
+    def _acq_data_q(self, b, args, ch, mode):
+        chan = int(ch)
+        data = b.channel_data(chan)
+        params = [p.strip() for p in args.split(',')] if args else []
+        if mode == "":
+            values = data
+        elif mode in (":STA:N", ":START:N"):
+            start, n = int(params[0]), int(params[1])
+            values = np.take(data, np.arange(start, start + n), mode='wrap')
+        elif mode in (":STA:END", ":START:END", ":STA:E", ":START:E"):
+            start, end = int(params[0]), int(params[1])
+            values = data[start:end + 1] if end >= start else np.concatenate((data[start:], data[:end + 1]))
+        elif mode in (":OLD:N", ":O:N"):
+            values = data[:int(params[0])]
+        elif mode in (":LAT:N", ":LATEST:N"):
+            n = int(params[0])
+            values = data[BUFFER_SIZE - n:]
+        elif mode in (":TR", ":TRIG"):
+            n, pos = int(params[0]), params[1].upper()
+            tp = b.trigger_position()
+            if pos == "PRE_TRIG":
+                idx = np.arange(tp - n + 1, tp + 1)
+            elif pos == "POST_TRIG":
+                idx = np.arange(tp, tp + n)
+            elif pos == "PRE_POST_TRIG":
+                idx = np.arange(tp - n, tp + n + 1)
+            else:
+                raise ValueError(pos)
+            values = np.take(data, idx, mode='wrap')
+        else:
+            raise ValueError(mode)
+
+        return b.encode(chan, values)
+
+    # Generator
+    def _sour(self, b, args, ch, key, cast):
+        for c in ((1, 2) if ch == "" else (int(ch),)):
+            b.gen[c][key] = cast(args)
+
+    def _sour_q(self, b, args, ch, key):
+        return b.gen[int(ch or 1)][key]
+
+    def _sour_func_reset(self, b, args, ch):
+        for c in ((1, 2) if ch == "" else (int(ch),)):
+            b.gen[c] = b._gen_defaults()
+
+    def _sour_trig(self, b, args, ch):
+        return None     # Generation is continuous, triggers are accepted and ignored
+
+    def _output_state(self, b, args, ch):
+        b.gen[int(ch)]["output"] = args.upper() in ("ON", "1")
+
+    def _output_state_q(self, b, args, ch):
+        return "ON" if b.gen[int(ch)]["output"] else "OFF"
+
+    # Digital and analog IO
+    def _dig_pin(self, b, args):
+        pin, state = [p.strip() for p in args.split(',')]
+        b.digital[pin.upper()] = int(state)
+
+    def _dig_pin_q(self, b, args):
+        return b.digital.get(args.strip().upper(), 0)
+
+    def _dig_pin_dir(self, b, args):
+        direction, pin = [p.strip() for p in args.split(',')]
+        b.digital_dir[pin.upper()] = direction.upper()
+
+    def _dig_rst(self, b, args):
+        b.digital.clear()
+        b.digital_dir.clear()
+
+    def _analog_pin(self, b, args):
+        pin, value = [p.strip() for p in args.split(',')]
+        m = re.fullmatch(r"AOUT([0-3])", pin.upper())
+        if m is None:
+            raise ValueError(pin)
+        b.analog_out[int(m.group(1))] = float(value)
+
+    def _analog_pin_q(self, b, args):
+        pin = args.strip().upper()
+        m = re.fullmatch(r"A(IN|OUT)([0-3])", pin)
+        if m is None:
+            raise ValueError(pin)
+        i = int(m.group(2))
+        return b.analog_in[i] if m.group(1) == "IN" else b.analog_out[i]
+
+    _SOUR_KEYS = [
+        (r"FUNC", "func", lambda a: a.upper()),
+        (r"FREQ:FIX", "freq", float),
+        (r"VOLT", "volt", float),
+        (r"VOLT:OFFS", "offs", float),
+        (r"PHAS", "phas", float),
+        (r"DCYC", "dcyc", float),
+    ]
+
+    _COMMANDS = [
+        (r"\*IDN\?", _idn),
+        (r"\*RST", _rst),
+        (r"\*CLS", _cls),
+        (r"\*STB\?", _stb),
+        (r"SYST(?:EM)?:ERR(?:OR)?:NEXT\?", _err_next),
+        (r"SYST(?:EM)?:ERR(?:OR)?:COUN(?:T)?\?", _err_count),
+        (r"ACQ:RST", _acq_rst),
+        (r"ACQ:START", _acq_start),
+        (r"ACQ:STOP", _acq_stop),
+        (r"ACQ:DEC(?::F(?:ACTOR)?)?", _acq_dec),
+        (r"ACQ:DEC(?::F(?:ACTOR)?)?\?", _acq_dec_q),
+        (r"ACQ:AVG", _acq_avg),
+        (r"ACQ:AVG\?", _acq_avg_q),
+        (r"ACQ:DATA:U(?:NITS)?", _acq_units),
+        (r"ACQ:DATA:U(?:NITS)?\?", _acq_units_q),
+        (r"ACQ:DATA:FORMAT", _acq_format),
+        (r"ACQ:DATA:FORMAT\?", _acq_format_q),
+        (r"ACQ:TR(?:IG)?", _acq_trig),
+        (r"ACQ:TR(?:IG)?:LEV", _acq_trig_lev),
+        (r"ACQ:TR(?:IG)?:LEV\?", _acq_trig_lev_q),
+        (r"ACQ:TR(?:IG)?:DLY", _acq_trig_dly),
+        (r"ACQ:TR(?:IG)?:DLY\?", _acq_trig_dly_q),
+        (r"ACQ:TR(?:IG)?:HYST", _acq_trig_hyst),
+        (r"ACQ:TR(?:IG)?:HYST\?", _acq_trig_hyst_q),
+        (r"ACQ:TR(?:IG)?:FILL\?", _acq_trig_fill_q),
+        (r"ACQ:TR(?:IG)?:STAT\?", _acq_trig_stat_q),
+        (r"ACQ:TPOS\?", _acq_tpos_q),
+        (r"ACQ:BUF:SIZE\?", _acq_buf_size_q),
+        (r"ACQ:SOUR([1-4]):GAIN", _acq_gain),
+        (r"ACQ:SOUR([1-4]):GAIN\?", _acq_gain_q),
+        (r"ACQ:SOUR([1-4]):DATA((?::[A-Z]+)*)\?", _acq_data_q),
+        (r"SOUR([12]?):FUNC:RESET", _sour_func_reset),
+        (r"SOUR([12]?):TR(?:IG)?(?::INT)?", _sour_trig),
+        (r"OUTPUT([12]):STATE", _output_state),
+        (r"OUTPUT([12]):STATE\?", _output_state_q),
+        (r"DIG:PIN", _dig_pin),
+        (r"DIG:PIN\?", _dig_pin_q),
+        (r"DIG:PIN:DIR", _dig_pin_dir),
+        (r"DIG:RST", _dig_rst),
+        (r"ANALOG:PIN", _analog_pin),
+        (r"ANALOG:PIN\?", _analog_pin_q),
+    ]
+    for _suffix, _key, _cast in _SOUR_KEYS:
+        _COMMANDS.append((r"SOUR([12]?):" + _suffix, lambda s, b, a, ch, _key=_key, _cast=_cast: s._sour(b, a, ch, _key, _cast)))
+        _COMMANDS.append((r"SOUR([12]?):" + _suffix + r"\?", lambda s, b, a, ch, _key=_key: s._sour_q(b, a, ch, _key)))
+    del _suffix, _key, _cast
+    _COMMANDS = [(re.compile(p), h) for p, h in _COMMANDS]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Red Pitaya SCPI simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="one-way link latency added to every reply")
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="link bandwidth in Mbit/s, 0 for unlimited")
+    parser.add_argument("--noise", type=float, default=0.0, help="noise added to acquired samples (V rms)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = ScpiSimulator(
+        args.host, args.port,
+        latency=args.latency_ms * 1e-3,
+        bandwidth=args.bandwidth_mbps * 1e6 / 8 if args.bandwidth_mbps > 0 else None,
+        noise=args.noise,
+        seed=args.seed,
+    )
+    print(f"Red Pitaya SCPI simulator listening on {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
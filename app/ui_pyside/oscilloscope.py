@@ -140,7 +140,15 @@ class Oscilloscope(QMainWindow):
 
         redpitaya_ip = QLineEdit("Red Pitaya IP:")
         redpitaya_ip.setText(self.rp_plot.rp_ip)
-        redpitaya_ip.textChanged.connect(self.rp_plot.update_rp_ip)
+
+        # Reconnect once typing pauses, not on every keystroke
+        self.ip_debounce_timer = QTimer(self)
+        self.ip_debounce_timer.setSingleShot(True)
+        self.ip_debounce_timer.setInterval(600)
+        self.ip_debounce_timer.timeout.connect(self.apply_rp_ip)
+        redpitaya_ip.textChanged.connect(lambda _: self.ip_debounce_timer.start())
+        redpitaya_ip.editingFinished.connect(self.apply_rp_ip)
+        self.redpitaya_ip = redpitaya_ip
         redpitaya_ip.setAlignment(Qt.AlignmentFlag.AlignCenter)
         ip_layout.addWidget(redpitaya_ip)
 
@@ -197,6 +205,13 @@ class Oscilloscope(QMainWindow):
 
         self.acquiring_layout.addRow("Decimation:", decimation_spin)
 
+        # Averaging
+        averaging_spin = QSpinBox()
+        averaging_spin.setRange(1, 1024)  # frames promediados, 1 = sin promedio
+        averaging_spin.setValue(1)
+        averaging_spin.valueChanged.connect(self.rp_plot.update_averaging)
+        self.acquiring_layout.addRow("Averages:", averaging_spin)
+
         # Crear barra de estado
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
@@ -417,9 +432,15 @@ class Oscilloscope(QMainWindow):
     def show_status_bar_msg(self, msg, time=3000):
         self.status_bar.showMessage(msg, time)
 
+    def apply_rp_ip(self):
+        self.ip_debounce_timer.stop()
+        self.rp_plot.update_rp_ip(self.redpitaya_ip.text())
+
     def timer_multiprocess(self):
         if self.rp_plot.rp_connected:
             self.status_label.setStyleSheet("background-color: green; border-radius: 8px;")
+        elif self.rp_plot.rp_connecting:
+            self.status_label.setStyleSheet("background-color: yellow; border-radius: 8px;")
         else:
             self.status_label.setStyleSheet("background-color: red; border-radius: 8px;")
 
@@ -17,23 +17,23 @@ import sys
 
 dark_theme = pyside6_simple_dark_theme
 
-serial_rp = serial.Serial(baudrate=115200)
-
-p = bk_figure(title="Signal", sizing_mode='stretch_both', x_axis_label='Time', y_axis_label='Voltage (V)', y_range=Range1d(start=-1, end=1), x_range=Range1d(start=-30, end=30)) # type: ignore
-    
-bokeh_plot = BokehPlot(plot_b=p,
-                        n_plots=2,
-                        roll_over=1000,
-                        colors=['green', 'purple', 'blue'],
-                        update_time=10,
-                        scatter_plot=True,
-                        oscilloscope_mode=True,
-)
+def create_plot(acquisition_process=False):
+    p = bk_figure(title="Signal", sizing_mode='stretch_both', x_axis_label='Time', y_axis_label='Voltage (V)', y_range=Range1d(start=-1, end=1), x_range=Range1d(start=-30, end=30)) # type: ignore
+
+    return BokehPlot(plot_b=p,
+                     n_plots=2,
+                     roll_over=1000,
+                     colors=['green', 'purple', 'blue'],
+                     update_time=10,
+                     scatter_plot=True,
+                     oscilloscope_mode=True,
+                     acquisition_process=acquisition_process,
+    )
 
 def modify_doc(doc, bokeh_plot):
   bokeh_plot.attach_doc(doc)
 
-def start_bokeh_server():
+def start_bokeh_server(bokeh_plot):
     loop = IOLoop()
     loop.make_current()
     server = Server({'/': lambda doc: modify_doc(doc, bokeh_plot=bokeh_plot)}, io_loop=loop, allow_websocket_origin=["localhost:5006"])
@@ -42,7 +42,12 @@ def start_bokeh_server():
     loop.start()
 
 if __name__ == '__main__':
-    Thread(target=start_bokeh_server, daemon=True).start()
+    # The plot is created here: the acquisition process (--acquisition-process) imports
+    # this module again and must not build another one
+    serial_rp = serial.Serial(baudrate=115200)
+    bokeh_plot = create_plot(acquisition_process="--acquisition-process" in sys.argv)
+
+    Thread(target=start_bokeh_server, args=(bokeh_plot,), daemon=True).start()
 
     app = QApplication(sys.argv)
     app.setStyleSheet(dark_theme)
@@ -50,4 +55,6 @@ if __name__ == '__main__':
     window = Oscilloscope(app, rp_plot=bokeh_plot, url='http://localhost:5006')
     window.show()
 
-    sys.exit(app.exec())
+    code = app.exec()
+    bokeh_plot.worker.stop(timeout=2.0)
+    sys.exit(code)